@@ -0,0 +1,30 @@
+from flask import Blueprint, request
+
+from app_settings.settings import settings
+from authorization.jwt.keys import key_ring
+
+router = Blueprint('jwks', __name__)
+
+
+@router.route('/.well-known/jwks.json', methods=['GET'])
+def jwks():
+    """Открытые ключи для проверки JWT
+    ---
+    description: JWKS с открытыми ключами подписи. Сервисы-потребители проверяют токены локально по kid.
+    tags:
+      - AUTH
+    responses:
+      200:
+        description: Набор ключей
+        schema:
+          type: object
+          properties:
+          type: application/json
+          example: {
+            "keys": [{"kty": "RSA", "kid": "5f1c...", "use": "sig", "alg": "RS256", "n": "...", "e": "AQAB"}]
+          }
+    """
+    response = router.response_class(key_ring.jwks_json, mimetype='application/json')
+    response.headers['Cache-Control'] = f'public, max-age={settings.JWKS_CACHE_MAX_AGE}'
+    response.add_etag()
+    return response.make_conditional(request)
@@ -1,18 +1,19 @@
 from functools import wraps
 
 import requests
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, jsonify, request, stream_with_context
 from http import HTTPStatus
 
 from flask_jwt_extended import get_jwt, jwt_required, unset_jwt_cookies
 from werkzeug.datastructures import MultiDict
 
 from authorization.forms.login import LoginForm
-from authorization.forms.login_history import LoginHistoryForm
+from authorization.forms.login_history import EXPORT_FORMATS, LoginHistoryForm
 from authorization.forms.registration import RegistrationForm
 from authorization.forms.user_data import ChangeUserDataForm
-from authorization.jwt.installers import get_user_from_jwt, set_jwt_couple
+from authorization.jwt.installers import get_user_from_jwt, refresh_jwt_couple, set_jwt_couple
 from authorization.jwt.storage import (delete_all_tokens, delete_token, check_exists_refresh)
+from db.routing import read_only, replica
 
 router = Blueprint('v1/auth', __name__, url_prefix='/api/v1/auth')
 
@@ -192,13 +193,13 @@ def logout():
           }
     """
     jwt = get_jwt()
-    user = get_user_from_jwt(jwt)
+    user_id = jwt['sub']
 
     devices_logout = request.json and request.json.get('all_devices', False) is True or False
     if devices_logout:
-        delete_all_tokens(user)
+        delete_all_tokens(user_id)
     else:
-        delete_token(user, jwt)
+        delete_token(user_id, jwt)
 
     response = jsonify({"msg": "logout successful"})
     unset_jwt_cookies(response)
@@ -208,7 +209,6 @@ def logout():
 
 @router.route("/refresh", methods=["POST"])
 @jwt_required(refresh=True)
-@allowed_refresh
 def update_tokens():
     """обновление access-токена
         ---
@@ -243,13 +243,13 @@ def update_tokens():
             "msg": "Missing cookie refresh_token_cookie"
           }
     """
-    refresh_token = jwt = get_jwt()
-    user = get_user_from_jwt(jwt)
-    user_agent = refresh_token['user_agent']
-    delete_token(user, refresh_token)
+    refresh_token = get_jwt()
 
+    # Проверка, что токен хранится у нас, и его замена делаются атомарно в refresh_jwt_couple.
     response = jsonify({"msg": "update was successful"})
-    set_jwt_couple(user, user_agent, response)
+    if not refresh_jwt_couple(refresh_token, response):
+        return jsonify({'error': 'Refresh token expired or not valid'}), HTTPStatus.UNAUTHORIZED
+
     return response
 
 
@@ -319,6 +319,7 @@ def change_authentication():
 
 @router.route("/login-history", methods=["GET"])
 @jwt_required()
+@read_only
 def get_login_history():
     """получение пользователем своей истории входов в аккаунт
         ---
@@ -358,6 +359,18 @@ def get_login_history():
                 date_to:
                   type: integer
                   example: 10
+          - name: cursor
+            in: query
+            description: Постраничный вывод по курсору вместо page. Пустое значение - первая страница,
+              дальше передаётся next_cursor из предыдущего ответа.
+            schema:
+              type: string
+          - name: total
+            in: query
+            description: Только для cursor. exact - точное количество, approximate - оценка, по умолчанию не считается.
+            schema:
+              type: string
+              enum: ['exact', 'approximate']
         responses:
           200:
             description: test login description
@@ -400,15 +413,92 @@ def get_login_history():
                 "msg": "Missing cookie access_token_cookie"
               }
         """
-    access_token = get_jwt()
-    user = get_user_from_jwt(access_token)
+    # Формам нужен только id пользователя: на реплике только что зарегистрированного пользователя может ещё не быть.
+    user_id = get_jwt()['sub']
     form = LoginHistoryForm(MultiDict({
         'date_from': request.args.get('date_from', ''),
         'date_to': request.args.get('date_to', ''),
         'page': request.args.get('page', 1),
         'per_page': request.args.get('per_page', 25),
+        'cursor': request.args.get('cursor'),
+        'total': request.args.get('total', ''),
     }))
 
-    login_history_list = form.get_login_history(user)
+    login_history_list = form.get_login_history(user_id)
     response = jsonify(login_history_list)
     return response
+
+
+@router.route("/login-history/export", methods=["GET"])
+@jwt_required()
+@read_only
+def export_login_history():
+    """выгрузка пользователем всей своей истории входов
+        ---
+        description: Потоково отдаёт историю входов за период, либо за всё время, в csv или ndjson.
+        tags:
+          - AUTH
+        parameters:
+          - name: date_from
+            in: query
+            schema:
+              type: string
+              example: 01-02-2022
+          - name: date_to
+            in: query
+            schema:
+              type: string
+              example: 01-03-2022
+          - name: format
+            in: query
+            schema:
+              type: string
+              enum: ['csv', 'ndjson']
+              default: csv
+        responses:
+          200:
+            description: История входов от старых записей к новым
+            content:
+              text/csv:
+                example: |
+                  created_at,ip4,user_agent,platform,browser
+                  2022-02-26T11:11:04,127.0.0.1,Mozilla/5.0 (X11; Linux x86_64),linux,chrome
+          400:
+            description: Невалидные параметры
+            schema:
+              type: object
+              properties:
+              type: application/json
+              example: {
+                "error": "Unknown format"
+              }
+          401:
+            description: Юзер не авторизован
+            schema:
+              type: object
+              properties:
+              type: application/json
+              example: {
+                "msg": "Missing cookie access_token_cookie"
+              }
+        """
+    export_format = request.args.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': 'Unknown format'}), HTTPStatus.BAD_REQUEST
+
+    user_id = get_jwt()['sub']
+    form = LoginHistoryForm(MultiDict({
+        'date_from': request.args.get('date_from', ''),
+        'date_to': request.args.get('date_to', ''),
+    }))
+
+    mimetype = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+
+    def generate():
+        # Генератор выполняется уже после выхода из представления, поэтому реплику включаем в нём самом.
+        with replica():
+            yield from form.export(user_id, export_format)
+
+    response = Response(stream_with_context(generate()), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename=login_history.{export_format}'
+    return response
@@ -5,9 +5,9 @@ from flask_jwt_extended import jwt_required, get_jwt
 from werkzeug.datastructures import MultiDict
 
 from authorization.forms.login import LoginForm
-from authorization.forms.oauth import OauthUrlForm, OauthServiceForm
 from authorization.forms.registration import RegistrationForm
 from authorization.jwt.installers import set_jwt_couple
+from authorization.services.oauth import get_service
 
 from db.initial import db
 from db.models import User, SocialRelation
@@ -16,6 +16,8 @@ from utils.limit import limit
 
 router = Blueprint('v1/oauth', __name__, url_prefix='/api/v1/oauth')
 
+SERVICE_NOT_FOUND = {'service': ['Service with this name not found']}
+
 
 @router.route('/register/<service>', methods=['GET'])
 def get_oauth_register_url(service):
@@ -40,13 +42,11 @@ def get_oauth_register_url(service):
               type: string
               example: http://oauth.yandex.ru/authorize?...
     """
-    form = OauthUrlForm(MultiDict({
-        'service': service,
-    }))
-    if not form.validate():
-        return jsonify({'error': form.errors}), HTTPStatus.BAD_REQUEST
+    oauth_service = get_service(service)
+    if oauth_service is None:
+        return jsonify({'error': SERVICE_NOT_FOUND}), HTTPStatus.BAD_REQUEST
 
-    url = form.get_register_url()
+    url = oauth_service.get_register_url()
 
     return jsonify({
         'url': url
@@ -76,13 +76,11 @@ def get_oauth_login_url(service):
               type: string
               example: http://oauth.yandex.ru/authorize?...
     """
-    form = OauthUrlForm(MultiDict({
-        'service': service,
-    }))
-    if not form.validate():
-        return jsonify({'error': form.errors}), HTTPStatus.BAD_REQUEST
+    oauth_service = get_service(service)
+    if oauth_service is None:
+        return jsonify({'error': SERVICE_NOT_FOUND}), HTTPStatus.BAD_REQUEST
 
-    url = form.get_login_url()
+    url = oauth_service.get_login_url()
 
     return jsonify({
         'url': url
@@ -115,15 +113,13 @@ def oauth_callback_register(service):
           }
     """
     code = request.args.get('code')
-    form = OauthServiceForm(MultiDict({
-        'service': service,
-    }))
+    service = get_service(service)
+    if service is None:
+        return jsonify({'error': SERVICE_NOT_FOUND}), HTTPStatus.BAD_REQUEST
 
-    if not form.validate():
-        return jsonify({'error': form.errors}), HTTPStatus.BAD_REQUEST
-
-    service = form.get_service()
     register_data = service.get_register_data(code)
+    if not register_data:
+        return jsonify({'error': 'Failed to get user data from the provider'}), HTTPStatus.BAD_GATEWAY
 
     random_password = RegistrationForm.generate_random_password()
 
@@ -174,15 +170,13 @@ def oauth_callback_login(service):
               example: login successful
     """
     code = request.args.get('code')
-    form = OauthServiceForm(MultiDict({
-        'service': service,
-    }))
-
-    if not form.validate():
-        return jsonify({'error': form.errors}), HTTPStatus.BAD_REQUEST
+    service = get_service(service)
+    if service is None:
+        return jsonify({'error': SERVICE_NOT_FOUND}), HTTPStatus.BAD_REQUEST
 
-    service = form.get_service()
     register_data = service.get_login_data(code)
+    if not register_data:
+        return jsonify({'error': 'Failed to get user data from the provider'}), HTTPStatus.BAD_GATEWAY
 
     login_form = LoginForm()
     user = User.query.filter_by(email=register_data['email'], is_active=True).first()
@@ -1,14 +1,24 @@
-from flask import jsonify, request
+import json
+
+from flask import Response, jsonify, request, stream_with_context
 from werkzeug.datastructures import MultiDict
 from flask_restful import Api, Resource
 from http import HTTPStatus
 
+from app_settings.settings import settings
+from authorization.forms.registration import bulk_register
 from authorization.jwt.extra import jwt_required_with_roles
-from db.models import Role
+from authorization.jwt.storage import revoke_users_tokens
+from db.cache import roles_cache
+from db.initial import db
+from db.pool import pool_stats
+from db.reference import reference_cache
+from db.routing import read_only
 from permission.forms.change_role import RoleChangeForm
 from permission.forms.create_role import RoleCreateForm
 from permission.forms.delete_role import RoleDeleteForm
 from permission.forms.get_roles import GetUserRolesForm
+from permission.forms.revoke_tokens import RevokeTokensForm
 from permission.forms.set_role import RoleResetForm, RoleSetForm
 from utils.limit import limit
 
@@ -20,6 +30,7 @@ class RoleWithoutIdView(Resource):
 
     @jwt_required_with_roles(roles={ADMIN})
     @limit
+    @read_only
     def get(self):
         """Просмотр всех ролей
         ---
@@ -62,7 +73,7 @@ class RoleWithoutIdView(Resource):
             'name': role.name,
             'description': role.description,
             'id': str(role.id)
-        } for role in Role.query.all()]
+        } for role in reference_cache.roles()]
 
         return jsonify(result)
 
@@ -426,6 +437,7 @@ class RoleUserCheckView(Resource):
 
     @jwt_required_with_roles()
     @limit
+    @read_only
     def get(self, user_id):
         """Проверка наличя прав у пользователя
         ---
@@ -490,7 +502,223 @@ class RoleUserCheckView(Resource):
         return jsonify(roles)
 
 
+class RolesCacheStatsView(Resource):
+
+    @jwt_required_with_roles(roles={ADMIN})
+    def get(self):
+        """Статистика кеша ролей
+        ---
+        description: Счётчики попаданий и промахов кеша ролей текущего процесса.
+        tags:
+          - ROLE
+        responses:
+          200:
+            description: Успешный ответ
+            schema:
+              type: object
+              properties:
+              type: application/json
+              example: {
+                "local_size": 10,
+                "local_hits": 120,
+                "redis_hits": 15,
+                "misses": 3,
+                "invalidations": 1
+              }
+          401:
+            description: Юзер не авторизован
+            schema:
+              type: object
+              properties:
+              type: application/json
+              example: {
+                "msg": "Missing cookie access_token_cookie"
+              }
+        """
+        return jsonify(roles_cache.stats())
+
+
+class DbPoolStatsView(Resource):
+
+    @jwt_required_with_roles(roles={ADMIN})
+    def get(self):
+        """Статистика пула соединений Postgres
+        ---
+        description: Состояние пула соединений текущего процесса и время ожидания свободного соединения.
+        tags:
+          - ROLE
+        responses:
+          200:
+            description: Успешный ответ
+            schema:
+              type: object
+              properties:
+              type: application/json
+              example: {
+                "size": 20,
+                "checked_out": 3,
+                "checked_in": 17,
+                "overflow": -17,
+                "checkouts": 1520,
+                "timeouts": 0,
+                "wait_avg_ms": 0.012,
+                "wait_max_ms": 4.1
+              }
+          401:
+            description: Юзер не авторизован
+            schema:
+              type: object
+              properties:
+              type: application/json
+              example: {
+                "msg": "Missing cookie access_token_cookie"
+              }
+        """
+        return jsonify(pool_stats.stats(db.engine.pool))
+
+
+class TokensRevokeView(Resource):
+
+    @jwt_required_with_roles(roles={ADMIN})
+    def post(self):
+        """Массовый отзыв refresh-токенов
+        ---
+        description: Разлогинивает на всех устройствах перечисленных пользователей и/или всех владельцев роли.
+            Прогресс отдаётся потоком, по строке JSON на каждую обработанную пачку.
+        tags:
+          - ROLE
+        parameters:
+          - name: body
+            in: body
+            required: true
+            schema:
+              type: object
+              properties:
+                user_ids:
+                  type: array
+                  items:
+                    type: string
+                  example: ["af165836-de8a-40c5-b40f-73bc2c987ddf"]
+                role_id:
+                  type: string
+                  example: 67900d47-4dd0-4af8-a64d-56749c3818d7
+        responses:
+          200:
+            description: Поток прогресса в формате NDJSON
+            schema:
+              type: object
+              properties:
+              type: application/x-ndjson
+              example: {"processed": 500, "total": 1200, "revoked_tokens": 731}
+          400:
+            description: Невалидные параметры
+            schema:
+              type: object
+              properties:
+              type: application/json
+              example: {
+                "msg": "Fill in at least one field"
+              }
+          403:
+            description: Нет прав доступа
+            schema:
+              type: object
+              properties:
+              type: application/json
+              example: {
+                "msg": "No access rights"
+              }
+        """
+        body = request.json or {}
+        user_ids, role_id = body.get('user_ids', []), body.get('role_id', '')
+        if not isinstance(user_ids, list) or not isinstance(role_id, str):
+            return jsonify({'error': 'Expected user_ids to be a list and role_id a string'}), HTTPStatus.BAD_REQUEST
+
+        data = MultiDict([('user_ids', user_id) for user_id in user_ids])
+        data.add('role_id', role_id)
+
+        form = RevokeTokensForm(data)
+        if not form.validate():
+            return jsonify({'error': form.errors}), HTTPStatus.BAD_REQUEST
+
+        user_ids = form.get_user_ids()
+
+        def generate():
+            for progress in revoke_users_tokens(user_ids):
+                yield json.dumps(progress) + '\n'
+
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
+class UsersBulkCreateView(Resource):
+
+    @jwt_required_with_roles(roles={ADMIN})
+    def post(self):
+        """Массовая регистрация пользователей
+        ---
+        description: Создаёт пользователей с базовой ролью пачками. Невалидные и уже существующие пропускаются.
+        tags:
+          - ROLE
+        parameters:
+          - name: body
+            in: body
+            required: true
+            schema:
+              type: object
+              properties:
+                users:
+                  type: array
+                  items:
+                    type: object
+                    properties:
+                      email:
+                        type: string
+                      password:
+                        type: string
+                  example: [{"email": "user@example.com", "password": "password"}]
+        responses:
+          200:
+            description: Успешный ответ
+            schema:
+              type: object
+              properties:
+              type: application/json
+              example: {
+                "created": 1,
+                "errors": {"existing@example.com": ["User with this email address already exists"]}
+              }
+          400:
+            description: Невалидные параметры
+            schema:
+              type: object
+              properties:
+              type: application/json
+              example: {
+                "error": "Expected a list of at most 10000 users"
+              }
+          403:
+            description: Нет прав доступа
+            schema:
+              type: object
+              properties:
+              type: application/json
+              example: {
+                "msg": "No access rights"
+              }
+        """
+        users = (request.json or {}).get('users')
+        if not isinstance(users, list) or len(users) > settings.BULK_REGISTRATION_MAX_USERS:
+            error = f'Expected a list of at most {settings.BULK_REGISTRATION_MAX_USERS} users'
+            return jsonify({'error': error}), HTTPStatus.BAD_REQUEST
+
+        return jsonify(bulk_register(users))
+
+
 api.add_resource(RoleWithoutIdView, '/api/v1/roles')
 api.add_resource(RoleWIthIdView, '/api/v1/roles/<role_id>')
 api.add_resource(RoleUserView, '/api/v1/user/<user_id>/role/<role_id>')
 api.add_resource(RoleUserCheckView, '/api/v1/user-roles/<user_id>')
+api.add_resource(RolesCacheStatsView, '/api/v1/roles-cache/stats')
+api.add_resource(TokensRevokeView, '/api/v1/tokens/revoke')
+api.add_resource(DbPoolStatsView, '/api/v1/db-pool/stats')
+api.add_resource(UsersBulkCreateView, '/api/v1/users/bulk')
@@ -1,15 +1,21 @@
+from http import HTTPStatus
+
 from flasgger import Swagger
-from flask import Flask, request
+from flask import Flask, jsonify, request
 from flask_jwt_extended import JWTManager
 from flask_migrate import Migrate
-from flask_opentracing import FlaskTracer
-from jaeger_client import Config
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 
+from api.jwks_views import router as jwks_router
 from api.v1.auth_views import router as auth_router
 from api.v1.oauth_views import router as oauth_router
 from api.v1.roles_views import api
 from app_settings.settings import settings
+from authorization.jwt.keys import init_jwt_keys
+from authorization.password.executor import HashingBusyError
+from authorization.services.http_client import ProviderUnavailableError
 from db.initial import db, init_db
+from utils.tracer import init_tracing
 
 
 def main():
@@ -17,9 +23,11 @@ def main():
     app.config.from_object(settings)
     app.register_blueprint(auth_router)
     app.register_blueprint(oauth_router)
+    app.register_blueprint(jwks_router)
 
     Swagger(app)
-    JWTManager(app)
+    jwt = JWTManager(app)
+    init_jwt_keys(jwt)
     api.init_app(app)
     init_db(app)
     app.app_context().push()
@@ -27,27 +35,22 @@ def main():
     migrate = Migrate()
     migrate.init_app(app, db)
 
-    def _setup_jaeger():
-        config = Config(
-            config={
-                'sampler': {
-                    'type': 'const',
-                    'param': 1,
-                },
-                'local_agent': {
-                    'reporting_host': "jaeger",
-                    'reporting_port': 6831,
-                },
-            },
-            service_name='auth',
-            validate=True,
-        )
-        return config.initialize_tracer()
-
-    tracer = FlaskTracer(_setup_jaeger, True, app=app)
-    app.tracer = tracer
-
-    # Трассируем всё.
+    @app.errorhandler(HashingBusyError)
+    @app.errorhandler(PoolTimeoutError)
+    def server_busy(error):
+        response = jsonify({'error': 'Server is busy, try again later'})
+        response.headers['Retry-After'] = '1'
+        return response, HTTPStatus.SERVICE_UNAVAILABLE
+
+    @app.errorhandler(ProviderUnavailableError)
+    def provider_unavailable(error):
+        response = jsonify({'error': 'OAuth provider is unavailable, try again later'})
+        response.headers['Retry-After'] = str(int(settings.OAUTH_CIRCUIT_RESET_TIMEOUT))
+        return response, HTTPStatus.SERVICE_UNAVAILABLE
+
+    tracer = init_tracing(app)
+
+    # Трассируем все запросы, в Jaeger уходит выборка по настройкам TRACING_*.
     @tracer.trace()
     @app.before_request
     def before_request():
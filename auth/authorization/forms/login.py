@@ -1,14 +1,16 @@
 from typing import Optional
 
-from flask import request
+from flask import current_app, request
 from flask_wtf import FlaskForm
 from wtforms import StringField
 from wtforms.validators import InputRequired
 
-from authorization.password.main import verify_password
+from app_settings.settings import settings
+from authorization.password.main import verify_and_update_password
 from db.initial import db
+from db.login_history_writer import login_history_writer, push_login_event
 from db.models import LoginHistory, User
-from utils.client import get_ip
+from utils.client import get_ip, parse_user_agent
 
 
 class LoginForm(FlaskForm):
@@ -41,29 +43,44 @@ class LoginForm(FlaskForm):
         if not user:
             return None
 
-        is_valid_password = verify_password(
+        is_valid_password, new_hash = verify_and_update_password(
             password=self.data['password'],
             hashed_password=user.password,
         )
 
-        if is_valid_password:
-            return user
+        if not is_valid_password:
+            return None
+
+        # Хеш устарел по текущей политике - перехешируем, пока знаем открытый пароль.
+        if new_hash:
+            user.password = new_hash
+            db.session.commit()
+
+        return user
 
     @staticmethod
     def save_login_info(user: User, request: request) -> LoginHistory:
+        """
+        Сохраняет событие входа.
+
+        Запись в login_history происходит в фоне (db/login_history_writer.py),
+        поэтому возвращаемый объект в сессию не добавлен.
+        """
 
         ip4 = get_ip(request)
+        # Берём заголовок напрямую: request.user_agent разбирал бы строку заново на каждый вход.
+        user_agent = parse_user_agent(request.headers.get('User-Agent', ''))
 
         login_data = {
-            'user_agent': request.user_agent.string,
-            'platform': request.user_agent.platform,
-            'browser': request.user_agent.browser,
+            **user_agent._asdict(),
             'ip4': ip4,
             'user_id': user.id,
         }
 
-        login_snapshot = LoginHistory(**login_data)
-        db.session.add(login_snapshot)
-        db.session.commit()
+        if settings.LOGIN_HISTORY_WRITER_IN_PROCESS:
+            login_history_writer.start(current_app._get_current_object())
+
+        event = push_login_event(login_data)
+        login_snapshot = LoginHistory(**{**login_data, 'id': event['id']})
 
         return login_snapshot
@@ -1,11 +1,81 @@
-from datetime import timedelta
-from typing import List
+import base64
+import csv
+import io
+import json
+import uuid
+from datetime import date, datetime, timedelta
+from typing import Iterator, List, Optional
 
 from flask_wtf import FlaskForm
-from werkzeug.exceptions import NotFound
-from wtforms import DateField, IntegerField
+from sqlalchemy import tuple_
+from werkzeug.exceptions import BadRequest, NotFound
+from wtforms import DateField, IntegerField, StringField
 
-from db.models import LoginHistory, User
+from app_settings.settings import settings
+from db.models import LoginHistory
+from db.queries import get_approximate_count
+
+EXPORT_FORMATS = ('csv', 'ndjson')
+EXPORT_FIELDS = ('created_at', 'ip4', 'user_agent', 'platform', 'browser')
+
+
+def encode_cursor(model: LoginHistory) -> str:
+    data = json.dumps([model.created_at.isoformat(), str(model.id)])
+    return base64.urlsafe_b64encode(data.encode()).decode()
+
+
+def decode_cursor(cursor: str):
+    try:
+        created_at, model_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        # Курсор приходит от клиента: uuid.UUID(123) и datetime.fromisoformat(123) падают не с ValueError.
+        if not isinstance(created_at, str) or not isinstance(model_id, str):
+            raise ValueError('Cursor fields must be strings')
+        return datetime.fromisoformat(created_at), uuid.UUID(model_id)
+    except (AttributeError, TypeError, ValueError):
+        raise BadRequest('Invalid cursor')
+
+
+def filter_login_history(user_id, date_from: Optional[date] = None, date_to: Optional[date] = None):
+    query = LoginHistory.query.filter(LoginHistory.user_id == str(user_id))
+
+    if date_from:
+        query = query.filter(LoginHistory.created_at > date_from)
+
+    if date_to:
+        query = query.filter(LoginHistory.created_at < date_to + timedelta(days=1))
+
+    return query
+
+
+def export_login_history(query, export_format: str = 'csv') -> Iterator[str]:
+    """
+    Отдаёт историю входов построчно в csv или ndjson.
+
+    Строки читаются серверным курсором по LOGIN_HISTORY_EXPORT_CHUNK_SIZE штук,
+    поэтому память не зависит от размера истории.
+    """
+    rows = query \
+        .with_entities(*[getattr(LoginHistory, field) for field in EXPORT_FIELDS]) \
+        .order_by(LoginHistory.created_at, LoginHistory.id) \
+        .yield_per(settings.LOGIN_HISTORY_EXPORT_CHUNK_SIZE)
+
+    if export_format == 'ndjson':
+        for row in rows:
+            yield json.dumps({**row._asdict(), 'created_at': row.created_at.isoformat()}) + '\n'
+        return
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_FIELDS)
+
+    for i, row in enumerate(rows, 1):
+        writer.writerow((row.created_at.isoformat(), *row[1:]))
+        if i % settings.LOGIN_HISTORY_EXPORT_CHUNK_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    yield buffer.getvalue()
 
 
 class LoginHistoryForm(FlaskForm):
@@ -19,17 +89,29 @@ class LoginHistoryForm(FlaskForm):
     date_to = DateField(format="%d-%m-%Y")
     page = IntegerField()
     per_page = IntegerField()
+    # Пустая строка - первая страница постраничного вывода по курсору, None - вывод по номеру страницы.
+    cursor = StringField()
+    # exact - точный COUNT(*), approximate - оценка планировщика, иначе total не считается (только для курсора).
+    total = StringField()
 
-    def get_login_history(self, user: User) -> dict:
-        date_from = self.data['date_from']
-        date_to = self.data['date_to']
-        query = LoginHistory.query.filter(LoginHistory.user_id == str(user.id))
+    def get_query(self, user_id):
+        return filter_login_history(user_id, self.data['date_from'], self.data['date_to'])
 
-        if date_from:
-            query = query.filter(LoginHistory.created_at > date_from)
+    @staticmethod
+    def serialize(model: LoginHistory) -> dict:
+        return dict(
+            user_agent=model.user_agent,
+            platform=model.platform,
+            browser=model.browser,
+            created_at=model.created_at,
+            ip4=model.ip4,
+        )
 
-        if date_to:
-            query = query.filter(LoginHistory.created_at < date_to + timedelta(days=1))
+    def get_login_history(self, user_id) -> dict:
+        if self.data['cursor'] is not None:
+            return self.get_login_history_by_cursor(user_id)
+
+        query = self.get_query(user_id)
 
         try:
             query = query.paginate(page=self.data['page'], per_page=self.data['per_page'])
@@ -37,18 +119,51 @@ class LoginHistoryForm(FlaskForm):
             query = query.paginate(page=1, per_page=self.data['per_page'])
 
         return {
-            'items': [
-                dict(
-                    user_agent=model.user_agent,
-                    platform=model.platform,
-                    browser=model.browser,
-                    created_at=model.created_at,
-                    ip4=model.ip4,
-                ) for model in query.items
-            ],
+            'items': [self.serialize(model) for model in query.items],
             'has_next': query.has_next,
             'has_prev': query.has_prev,
             'page': query.page,
             'pages': query.pages,
             'total': query.total,
         }
+
+    def get_login_history_by_cursor(self, user_id) -> dict:
+        """
+        Постраничный вывод по курсору (created_at, id) вместо OFFSET.
+
+        Записи идут от новых к старым. Условие created_at <= курсора позволяет Postgres
+        не трогать более новые партиции, а индекс (user_id, created_at) - не сканировать лишнее.
+        """
+        query = self.get_query(user_id)
+        per_page = self.data['per_page'] or 25
+
+        total = None
+        if self.data['total'] == 'exact':
+            total = query.order_by(None).count()
+        elif self.data['total'] == 'approximate':
+            total = get_approximate_count(query)
+
+        if self.data['cursor']:
+            created_at, model_id = decode_cursor(self.data['cursor'])
+            query = query.filter(
+                LoginHistory.created_at <= created_at,
+                tuple_(LoginHistory.created_at, LoginHistory.id) < tuple_(created_at, model_id),
+            )
+
+        models = query \
+            .order_by(LoginHistory.created_at.desc(), LoginHistory.id.desc()) \
+            .limit(per_page + 1) \
+            .all()
+
+        has_next = len(models) > per_page
+        models = models[:per_page]
+
+        return {
+            'items': [self.serialize(model) for model in models],
+            'has_next': has_next,
+            'next_cursor': encode_cursor(models[-1]) if has_next else None,
+            'total': total,
+        }
+
+    def export(self, user_id, export_format: str) -> Iterator[str]:
+        return export_login_history(self.get_query(user_id), export_format)
@@ -1,16 +1,22 @@
 import random
 import string
-from typing import Optional
+import uuid
+from typing import Iterable, List, Optional
 
 from flask_wtf import FlaskForm
 from werkzeug.datastructures import MultiDict
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import IntegrityError
 from wtforms import EmailField, StringField
-from wtforms.validators import InputRequired
+from wtforms.validators import Email, InputRequired
 
-from authorization.password.main import encrypt_password
+from app_settings.settings import settings
+from authorization.jwt.storage import touch_security_stamp
+from authorization.password.executor import HashingBusyError
+from authorization.password.main import encrypt_password, encrypt_passwords
 from db.initial import db
-from db.models import User, Role, RoleRelation, SocialNetwork, SocialRelation
-from permission.forms.create_role import RoleCreateForm
+from db.models import User, RoleRelation, SocialRelation
+from db.reference import get_default_role_id, reference_cache
 
 from utils.validators import RegistrationEmail, StringLength
 
@@ -43,25 +49,18 @@ class RegistrationForm(FlaskForm):
             return
 
         new_user = User(
+            id=uuid.uuid4(),
             email=self.data['email'],
             password=encrypt_password(password=self.data['password'])
         )
-        db.session.add(new_user)
-
-        default_role = Role.query.filter_by(name='SimpleUser').first()
-        if not default_role:
-            form = RoleCreateForm(MultiDict({
-                'name': 'SimpleUser',
-                'description': 'This is a role of custom User'
-            }))
-            default_role = form.create_new_role()
-        db.session.commit()
-
-        new_relatiol = RoleRelation(
+        new_relation = RoleRelation(
             user_id=new_user.id,
-            role_id=default_role.id
+            role_id=get_default_role_id()
         )
-        db.session.add(new_relatiol)
+        db.session.add(new_user)
+        # Пользователь должен быть вставлен раньше связи с ролью, всё остаётся в одной транзакции.
+        db.session.flush()
+        db.session.add(new_relation)
         db.session.commit()
         return new_user
 
@@ -80,10 +79,144 @@ class RegistrationForm(FlaskForm):
         user.first_name = first_name
         user.last_name = last_name
 
-        social_network = SocialNetwork.query.filter_by(name=network_name).first()
+        social_network = reference_cache.get_network_by_name(network_name)
         new_social_relation = SocialRelation(
             social_id=str(social_network.id),
             user_id=str(user.id),
         )
         db.session.add(new_social_relation)
         db.session.commit()
+        touch_security_stamp(user.id)
+
+
+class BulkUserForm(FlaskForm):
+    """
+    Проверка одного пользователя при массовой регистрации.
+
+    Уникальность email проверяется сразу для всей пачки, поэтому здесь запросов к базе нет.
+    """
+    class Meta:
+        csrf = False
+
+    email = EmailField(
+        'email',
+        validators=[
+            InputRequired('Please enter your email address.'),
+            Email('Please enter valid email address.'),
+        ]
+    )
+    password = StringField(
+        'password',
+        validators=[
+            InputRequired('Please enter your password.'),
+            StringLength(min=6, max=100, message='Password length must be at least 6 and no more than 100 characters.')
+        ]
+    )
+
+
+def _existing_emails(emails: List[str]) -> set:
+    return {email for email, in User.query.with_entities(User.email).filter(User.email.in_(emails))}
+
+
+def _insert_users(user_rows: List[dict]):
+    role_id = get_default_role_id()
+    db.session.execute(insert(User.__table__), user_rows)
+    db.session.execute(
+        insert(RoleRelation.__table__),
+        [{'id': uuid.uuid4(), 'user_id': row['id'], 'role_id': role_id} for row in user_rows],
+    )
+    db.session.commit()
+
+
+def _register_batch(users: List[dict], errors: dict) -> int:
+    """
+    Регистрирует одну пачку. Ошибки пачки записываются в errors по email,
+    чтобы уже закоммиченные пачки и остальной импорт не пропадали из-за одной неудачной.
+    """
+    existing = _existing_emails([user['email'] for user in users])
+
+    new_users = []
+    for user in users:
+        if user['email'] in existing:
+            errors[user['email']] = ['User with this email address already exists']
+        else:
+            existing.add(user['email'])
+            new_users.append(user)
+
+    if not new_users:
+        return 0
+
+    try:
+        hashes = encrypt_passwords(user['password'] for user in new_users)
+    except HashingBusyError:
+        for user in new_users:
+            errors[user['email']] = ['Password hashing is busy, please retry later']
+        return 0
+
+    user_rows = [
+        {'id': uuid.uuid4(), 'email': user['email'], 'password': password_hash}
+        for user, password_hash in zip(new_users, hashes)
+    ]
+
+    try:
+        _insert_users(user_rows)
+    except IntegrityError:
+        db.session.rollback()
+        # Кто-то зарегистрировал часть этих email одновременно с нами: отбрасываем их и пробуем ещё раз.
+        existing = _existing_emails([row['email'] for row in user_rows])
+        for email in existing:
+            errors[email] = ['User with this email address already exists']
+        user_rows = [row for row in user_rows if row['email'] not in existing]
+        if not user_rows:
+            return 0
+
+        try:
+            _insert_users(user_rows)
+        except IntegrityError:
+            db.session.rollback()
+            for row in user_rows:
+                errors[row['email']] = ['Registration conflict, please retry later']
+            return 0
+
+    return len(user_rows)
+
+
+def bulk_register(users: Iterable[dict]) -> dict:
+    """
+    Массовая регистрация пользователей с базовой ролью.
+
+    Пользователи вставляются пачками по BULK_REGISTRATION_BATCH_SIZE, каждая пачка - одна транзакция,
+    пароли пачки хешируются параллельно. Невалидные и уже существующие пользователи пропускаются.
+    Пачка, которую не удалось записать (очередь хеширования занята, конфликт email), попадает в errors,
+    импорт продолжается со следующей.
+
+    :param users: словари с ключами email и password, остальные записи попадают в errors
+    :return: {'created': количество созданных, 'errors': {email: ошибки}}
+    """
+    created, errors, batch = 0, {}, []
+
+    for user in users:
+        if not isinstance(user, dict):
+            errors[str(user)] = ['Expected an object with email and password']
+            continue
+
+        # Валидаторы WTForms и email_validator рассчитаны только на строки.
+        email, password = user.get('email', ''), user.get('password', '')
+        if not isinstance(email, str) or not isinstance(password, str):
+            errors[str(email)] = ['Email and password must be strings']
+            continue
+
+        form = BulkUserForm(MultiDict({'email': email, 'password': password}))
+        if not form.validate():
+            errors[email] = [error for field in form.errors.values() for error in field]
+            continue
+
+        batch.append(form.data)
+        if len(batch) >= settings.BULK_REGISTRATION_BATCH_SIZE:
+            created += _register_batch(batch, errors)
+            batch = []
+
+    if batch:
+        created += _register_batch(batch, errors)
+
+    return {'created': created, 'errors': errors}
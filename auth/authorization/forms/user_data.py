@@ -4,6 +4,7 @@ from flask_wtf import FlaskForm
 from wtforms import EmailField, StringField
 
 from authorization.forms.registration import RegistrationEmail, StringLength
+from authorization.jwt.storage import touch_security_stamp
 from authorization.password.main import encrypt_password, verify_password
 from db.initial import db
 from db.models import User
@@ -18,6 +19,7 @@ class ChangeUserDataForm(FlaskForm):
 
     def __init__(self, user, *args, **kwargs):
         self.user = user
+        self._is_valid_password = None
         super().__init__(*args, **kwargs)
 
     email = EmailField(
@@ -53,11 +55,13 @@ class ChangeUserDataForm(FlaskForm):
 
         result = super().validate(*args, **kwargs)
 
-        is_valid_password = verify_password(
-            password=old_password.data,
-            hashed_password=self.user.password,
-        )
-        if not is_valid_password:
+        # validate вызывается дважды (во вьюхе и в set_new_data), а проверка пароля дорогая.
+        if self._is_valid_password is None:
+            self._is_valid_password = verify_password(
+                password=old_password.data,
+                hashed_password=self.user.password,
+            )
+        if not self._is_valid_password:
             old_password.errors = ['Invalid old password']
             result = False
 
@@ -78,4 +82,5 @@ class ChangeUserDataForm(FlaskForm):
 
         db.session.add(user)
         db.session.commit()
+        touch_security_stamp(user.id)
         return user
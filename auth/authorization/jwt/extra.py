@@ -1,17 +1,75 @@
+import hashlib
+import time
 from functools import wraps
 
-from flask_jwt_extended import verify_jwt_in_request, get_jwt
+from flask import _request_ctx_stack, request
+from flask_jwt_extended import get_jwt, get_jwt_header, verify_jwt_in_request
+from flask_jwt_extended.config import config
+from flask_jwt_extended.view_decorators import _load_user
+
+from app_settings.settings import settings
+from utils.cache import LocalCache
+
+# Уже проверенные access-токены: sha256 токена -> (header, claims). Запись живёт до exp токена.
+verified_tokens = LocalCache(maxsize=settings.JWT_VERIFY_CACHE_SIZE, ttl=0)
+
+
+def _get_raw_access_token():
+    """Возвращает access-токен из cookies, если его можно брать из кеша без полной проверки."""
+    if config.csrf_protect and request.method in config.csrf_request_methods:
+        return None
+    return request.cookies.get(config.access_cookie_name)
+
+
+def _verify_cached(raw_token: str) -> bool:
+    """
+    Кладёт в контекст запроса уже проверенный ранее токен так же, как это делает verify_jwt_in_request.
+
+    Flask-JWT-Extended 4.3.x читает токен из _request_ctx_stack.top (не из g), поэтому пишем туда.
+
+    :return: True, если токен найден в кеше
+    """
+    cached = verified_tokens.get(hashlib.sha256(raw_token.encode()).digest())
+    if cached is None:
+        return False
+
+    jwt_header, jwt_data = cached
+    ctx = _request_ctx_stack.top
+    ctx.jwt_user = _load_user(jwt_header, jwt_data)
+    ctx.jwt_header = jwt_header
+    ctx.jwt = jwt_data
+    ctx.jwt_location = 'cookies'
+    return True
+
+
+def _remember_verified(raw_token: str, jwt_header: dict, jwt_data: dict):
+    ttl = jwt_data.get('exp', 0) - time.time()
+    if ttl > 0:
+        verified_tokens.set(hashlib.sha256(raw_token.encode()).digest(), (jwt_header, jwt_data), ttl=ttl)
 
 
 def jwt_required_with_roles(roles=None, optional=False, fresh=False, refresh=False, locations=None):
-    """Декоратор, проверяющий наличие роли у пользователя у представления, гдя обязательно jwt"""
+    """
+    Декоратор, проверяющий наличие роли у пользователя у представления, гдя обязательно jwt
+
+    Подпись access-токена проверяется один раз, дальше до его exp он берётся из verified_tokens.
+    """
+    required_roles = frozenset(roles or ())
+    use_cache = not (optional or fresh or refresh or locations)
+
     def wrapper(fn):
         @wraps(fn)
         def decorator(*args, **kwargs):
-            verify_jwt_in_request(optional, fresh, refresh, locations)
+            raw_token = _get_raw_access_token() if use_cache else None
+
+            if not raw_token or not _verify_cached(raw_token):
+                verify_jwt_in_request(optional, fresh, refresh, locations)
+                if raw_token:
+                    _remember_verified(raw_token, get_jwt_header(), get_jwt())
+
             claims = get_jwt()
 
-            if not roles or set(claims['roles']) & set(roles):
+            if not required_roles or not required_roles.isdisjoint(claims['roles']):
                 return fn(*args, **kwargs)
 
             return {'msg': 'No access rights'}
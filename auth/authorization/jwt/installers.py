@@ -1,41 +1,62 @@
+import uuid
+
 from flask_jwt_extended import (create_access_token, create_refresh_token,
                                 set_access_cookies, set_refresh_cookies)
 
-from authorization.jwt.storage import save_refresh
+from authorization.jwt.storage import (REFRESH_ROTATED, REFRESH_STALE,
+                                       rotate_refresh, save_refresh)
+from db.cache import roles_cache
 from db.models import User
-from db.queries import get_active_user_roles
-
 
-def get_payload(user, user_agent):
 
-    roles = [role.name for role in get_active_user_roles(user.id)]
+def _build_payload(user_id, name, user_agent):
+    roles = [role['name'] for role in roles_cache.get(user_id)]
     return {
-        'name': user.get_name(),
+        'name': name,
         'roles': roles,
         'user_agent': user_agent
     }
 
 
-def _set_access_token(user, payload, response):
+def get_payload(user, user_agent):
+    return _build_payload(user.id, user.get_name(), user_agent)
+
+
+def get_payload_from_claims(token: dict):
+    """Собирает payload по claims уже выданного токена, без обращения к таблице пользователей."""
+    return _build_payload(token['sub'], token['name'], token['user_agent'])
+
+
+def _set_access_token(user_id, payload, response):
     """Устанавливает новый JWT-access токен."""
     access_token = create_access_token(
-        identity=user.id,
+        identity=user_id,
         additional_claims=payload,
         fresh=True,
     )
     set_access_cookies(response=response, encoded_access_token=access_token)
 
 
-def _set_refresh_token(user, payload, response):
-    """Устанавливает новый JWT-refresh токен."""
+def _set_refresh_cookie(user_id, payload, token_id, response):
+    """
+    Выпускает JWT-refresh токен с заданным jti и кладёт его в cookies.
+
+    jti задаём сами, чтобы не декодировать только что созданный токен ради его id.
+    """
     refresh_token = create_refresh_token(
-        identity=user.id,
-        additional_claims=payload
+        identity=user_id,
+        additional_claims={**payload, 'jti': token_id}
     )
-    save_refresh(user=user, refresh_token=refresh_token)
     set_refresh_cookies(response=response, encoded_refresh_token=refresh_token)
 
 
+def _set_refresh_token(user_id, payload, response):
+    """Устанавливает новый JWT-refresh токен."""
+    token_id = str(uuid.uuid4())
+    save_refresh(user_id=user_id, token_id=token_id, user_agent=payload['user_agent'])
+    _set_refresh_cookie(user_id, payload, token_id, response)
+
+
 def set_jwt_couple(user, user_agent, response):
     """Устанавливает пару новых JWT токенов: access и refresh."""
 
@@ -43,12 +64,47 @@ def set_jwt_couple(user, user_agent, response):
         user, user_agent
     )
 
-    _set_access_token(user, payload, response)
-    _set_refresh_token(user, payload, response)
+    _set_access_token(user.id, payload, response)
+    _set_refresh_token(user.id, payload, response)
 
     return response
 
 
+def refresh_jwt_couple(refresh_token: dict, response) -> bool:
+    """
+    Обменивает refresh-токен на новую пару токенов.
+
+    Проверка, отзыв старого и сохранение нового refresh-токена - один вызов Redis (rotate_refresh).
+    В обычном случае хватает claims и кеша ролей - Postgres не нужен.
+    Если security stamp пользователя новее токена (деактивация, смена пароля или данных),
+    пользователь перечитывается из базы.
+
+    :return: False, если токен уже использован или отозван, либо пользователь больше не может войти
+    """
+    user_id = refresh_token['sub']
+    token_id = str(uuid.uuid4())
+
+    payload = None
+
+    result = rotate_refresh(user_id, refresh_token, token_id)
+    if result == REFRESH_STALE:
+        user = get_user_from_jwt(refresh_token)
+        if not user or not user.is_active:
+            return False
+
+        payload = get_payload(user, refresh_token['user_agent'])
+        result = rotate_refresh(user_id, refresh_token, token_id, check_stamp=False)
+
+    if result != REFRESH_ROTATED:
+        return False
+
+    payload = payload or get_payload_from_claims(refresh_token)
+    _set_access_token(user_id, payload, response)
+    _set_refresh_cookie(user_id, payload, token_id, response)
+
+    return True
+
+
 def get_user_from_jwt(token: dict):
     user_id = token['sub']
     user = User.query.filter_by(id=user_id).first()
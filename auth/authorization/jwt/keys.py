@@ -0,0 +1,178 @@
+import json
+import os
+import uuid
+from pathlib import Path
+from typing import Optional
+
+import click
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ed25519, rsa
+from flask_jwt_extended import JWTManager
+from jwt import InvalidTokenError
+from jwt.algorithms import OKPAlgorithm, RSAAlgorithm
+
+from app_settings.settings import settings
+
+PRIVATE_SUFFIX = '.pem'
+PUBLIC_SUFFIX = '.pub.pem'
+
+
+class KeyRing:
+    """
+    Ключи подписи JWT.
+
+    Каждый ключ - файл в JWT_KEYS_DIR, имя файла - kid:
+    <kid>.pem - закрытый ключ, им можно подписывать и проверять;
+    <kid>.pub.pem - открытый ключ выведенного из оборота ключа, им только проверяем ещё живые токены.
+    Подписываем ключом JWT_ACTIVE_KID, а если он не задан - самым новым закрытым ключом.
+    """
+
+    def __init__(self, keys_dir: str, active_kid: Optional[str] = None):
+        self.keys_dir = Path(keys_dir)
+        self.private_keys = {}
+        self.public_keys = {}
+        self.active_kid = active_kid
+        self.jwks_json = '{"keys": []}'
+
+    def load(self):
+        private_files = sorted(self.keys_dir.glob(f'*{PRIVATE_SUFFIX}'), key=os.path.getmtime)
+
+        for path in private_files:
+            if path.name.endswith(PUBLIC_SUFFIX):
+                kid = path.name[:-len(PUBLIC_SUFFIX)]
+                self.public_keys[kid] = serialization.load_pem_public_key(path.read_bytes())
+                continue
+
+            kid = path.name[:-len(PRIVATE_SUFFIX)]
+            private_key = serialization.load_pem_private_key(path.read_bytes(), password=None)
+            self.private_keys[kid] = private_key
+            self.public_keys[kid] = private_key.public_key()
+
+        if not self.private_keys:
+            raise RuntimeError(f'No JWT signing keys in {self.keys_dir}. Run authorization/jwt/keys.py generate')
+
+        if not self.active_kid:
+            self.active_kid = list(self.private_keys)[-1]
+
+        # JWKS не меняется до перезапуска, поэтому сериализуем его один раз.
+        self.jwks_json = json.dumps(self.jwks())
+        return self
+
+    @property
+    def signing_key(self):
+        return self.private_keys[self.active_kid]
+
+    def verification_key(self, kid: str):
+        return self.public_keys.get(kid)
+
+    def algorithm(self, kid: str) -> Optional[str]:
+        public_key = self.public_keys.get(kid)
+        if public_key is None:
+            return None
+        return 'EdDSA' if isinstance(public_key, ed25519.Ed25519PublicKey) else 'RS256'
+
+    def jwks(self) -> dict:
+        keys = []
+        for kid, public_key in self.public_keys.items():
+            alg = self.algorithm(kid)
+            algorithm = OKPAlgorithm if alg == 'EdDSA' else RSAAlgorithm
+            jwk = algorithm.to_jwk(public_key)
+
+            keys.append({**json.loads(jwk), 'kid': kid, 'use': 'sig', 'alg': alg})
+
+        return {'keys': keys}
+
+
+key_ring = KeyRing(settings.JWT_KEYS_DIR, settings.JWT_ACTIVE_KID)
+
+
+def is_asymmetric() -> bool:
+    return not settings.JWT_ALGORITHM.startswith('HS')
+
+
+def init_jwt_keys(jwt: JWTManager):
+    """Подключает key_ring к flask_jwt_extended: подпись активным ключом и kid в заголовке токена."""
+    if not is_asymmetric():
+        return
+
+    key_ring.load()
+
+    @jwt.encode_key_loader
+    def encode_key(identity):
+        return key_ring.signing_key
+
+    @jwt.decode_key_loader
+    def decode_key(jwt_header, jwt_data):
+        kid, algorithm = jwt_header.get('kid'), jwt_header.get('alg', '')
+
+        # Токены без kid подписаны общим секретом до перехода на ключи.
+        # Они принимаются, пока их алгоритм указан в JWT_DECODE_ALGORITHMS.
+        if kid is None and algorithm.startswith('HS') and algorithm in settings.JWT_DECODE_ALGORITHMS:
+            return settings.JWT_SECRET_KEY
+
+        # Алгоритм из заголовка должен совпадать с типом ключа, иначе PyJWT упадёт TypeError на чужом ключе.
+        public_key = key_ring.verification_key(kid)
+        if public_key is None or key_ring.algorithm(kid) != algorithm:
+            raise InvalidTokenError('Unknown signing key')
+        return public_key
+
+    @jwt.additional_headers_loader
+    def additional_headers(identity):
+        return {'kid': key_ring.active_kid}
+
+
+def generate_private_key(algorithm: str):
+    if algorithm == 'EdDSA':
+        return ed25519.Ed25519PrivateKey.generate()
+    return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+
+@click.group()
+def cli():
+    """Управление ключами подписи JWT."""
+
+
+@cli.command()
+@click.option('--algorithm', default=settings.JWT_ALGORITHM, show_default=True, type=click.Choice(['RS256', 'EdDSA']))
+@click.option('--if-missing', is_flag=True, help='Do nothing if a signing key already exists.')
+def generate(algorithm, if_missing):
+    """Создаёт новый ключ. Самый новый ключ становится активным после перезапуска сервиса."""
+    keys_dir = Path(settings.JWT_KEYS_DIR)
+    keys_dir.mkdir(parents=True, exist_ok=True)
+
+    existing = [path for path in keys_dir.glob(f'*{PRIVATE_SUFFIX}') if not path.name.endswith(PUBLIC_SUFFIX)]
+    if if_missing and existing:
+        return click.echo('Signing key already exists')
+
+    kid = uuid.uuid4().hex
+    private_key = generate_private_key(algorithm)
+    path = keys_dir / f'{kid}{PRIVATE_SUFFIX}'
+    path.write_bytes(private_key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.NoEncryption(),
+    ))
+    path.chmod(0o600)
+
+    click.echo(f'Generated {algorithm} key {kid}')
+
+
+@cli.command()
+@click.argument('kid')
+def retire(kid):
+    """Выводит ключ из оборота: закрытый ключ удаляется, открытый остаётся для проверки живых токенов."""
+    keys_dir = Path(settings.JWT_KEYS_DIR)
+    path = keys_dir / f'{kid}{PRIVATE_SUFFIX}'
+    private_key = serialization.load_pem_private_key(path.read_bytes(), password=None)
+
+    (keys_dir / f'{kid}{PUBLIC_SUFFIX}').write_bytes(private_key.public_key().public_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PublicFormat.SubjectPublicKeyInfo,
+    ))
+    path.unlink()
+
+    click.echo(f'Key {kid} retired')
+
+
+if __name__ == '__main__':
+    cli()
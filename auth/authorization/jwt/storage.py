@@ -1,10 +1,37 @@
-from flask_jwt_extended import decode_token
+import time
 
 from app_settings.settings import settings
 from db.no_sql import redis_client
 
+# Результаты rotate_refresh.
+REFRESH_REVOKED = 0
+REFRESH_ROTATED = 1
+REFRESH_STALE = 2
 
-def save_refresh(user, refresh_token):
+# KEYS: старый refresh, новый refresh, устройства пользователя, security stamp пользователя.
+# ARGV: user_agent, новый jti, ttl, iat старого токена, проверять ли security stamp.
+ROTATE_REFRESH_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+
+if ARGV[5] == '1' then
+    local stamp = redis.call('GET', KEYS[4])
+    if stamp and tonumber(ARGV[4]) <= tonumber(stamp) then
+        return 2
+    end
+end
+
+redis.call('DEL', KEYS[1])
+redis.call('SETEX', KEYS[2], ARGV[3], 'stored')
+redis.call('HSET', KEYS[3], ARGV[1], ARGV[2])
+return 1
+"""
+
+_rotate_refresh_script = redis_client.register_script(ROTATE_REFRESH_SCRIPT)
+
+
+def save_refresh(user_id, token_id: str, user_agent: str):
     """
     Сохраняет refresh-токен и устройство.
 
@@ -16,22 +43,49 @@ def save_refresh(user, refresh_token):
     Также мы запоминаем устройство пользователя, которому выдали этот токен.
     Если нужно будет везде разлогинить, то мы просто удалим все refresh-токены устрйоств, которые запоминали.
 
-    :param user:
-    :param user_agent:
-    :param refresh_token:
+    :param user_id:
+    :param token_id: jti refresh-токена
+    :param user_agent: устройство, которому выдан токен
     :return:
     """
-
-    token = decode_token(refresh_token)
-    token_id = token['jti']
-    user_agent = token['user_agent']
     value = 'stored'
 
     refresh_key = f'{settings.REFRESH_KEY}{token_id}'
-    device_key = f'{settings.DEVICE_KEY}{user.id}'
+    device_key = f'{settings.DEVICE_KEY}{user_id}'
+
+    pipe = redis_client.pipeline()
+    pipe.setex(refresh_key, settings.REFRESH_TOKEN_EXP, value)
+    pipe.hset(device_key, user_agent, token_id)
+    pipe.execute()
 
-    redis_client.setex(refresh_key, settings.REFRESH_TOKEN_EXP, value)
-    redis_client.hset(device_key, user_agent, token_id)
+
+def rotate_refresh(user_id, refresh_token: dict, new_token_id: str, check_stamp: bool = True) -> int:
+    """
+    Атомарно заменяет использованный refresh-токен новым за один вызов Redis.
+
+    Старый токен должен храниться у нас: из двух одновременных обновлений одним токеном
+    пройдёт только одно. Если check_stamp и токен выпущен раньше security stamp пользователя,
+    ничего не меняется и возвращается REFRESH_STALE - пользователя нужно перепроверить по базе.
+
+    :return: REFRESH_ROTATED, REFRESH_REVOKED или REFRESH_STALE
+    """
+    old_token_id = refresh_token['jti']
+
+    return _rotate_refresh_script(
+        keys=[
+            f'{settings.REFRESH_KEY}{old_token_id}',
+            f'{settings.REFRESH_KEY}{new_token_id}',
+            f'{settings.DEVICE_KEY}{user_id}',
+            f'{settings.SECURITY_STAMP_KEY}{user_id}',
+        ],
+        args=[
+            refresh_token['user_agent'],
+            new_token_id,
+            settings.REFRESH_TOKEN_EXP,
+            refresh_token['iat'],
+            int(check_stamp),
+        ],
+    )
 
 
 def check_exists_refresh(refresh_token: dict):
@@ -43,23 +97,87 @@ def check_exists_refresh(refresh_token: dict):
     return bool(exists)
 
 
-def delete_token(user, refresh_token: dict):
+def delete_token(user_id, refresh_token: dict):
     token_id = refresh_token['jti']
     user_agent = refresh_token['user_agent']
 
     refresh_key = f'{settings.REFRESH_KEY}{token_id}'
-    device_key = f'{settings.DEVICE_KEY}{user.id}'
+    device_key = f'{settings.DEVICE_KEY}{user_id}'
 
     redis_client.delete(refresh_key)
     redis_client.hdel(device_key, user_agent)
 
 
-def delete_all_tokens(user):
-    device_key = f'{settings.DEVICE_KEY}{user.id}'
+def _delete_users_tokens(user_ids: list) -> int:
+    """
+    Удаляет refresh-токены всех устройств пользователей за два round trip'а.
+
+    Сначала пайплайном читаются устройства, затем пайплайном удаляются их токены и сами устройства.
+    Все ключи передаются в команды явно, без вычисления имён внутри Lua-скрипта.
+    Удаляются только прочитанные устройства: токен, выданный между чтением и удалением, остаётся рабочим.
+    """
+    device_keys = [f'{settings.DEVICE_KEY}{user_id}' for user_id in user_ids]
+
+    pipe = redis_client.pipeline(transaction=False)
+    for device_key in device_keys:
+        pipe.hgetall(device_key)
+    users_devices = pipe.execute()
+
+    revoked = 0
+    pipe = redis_client.pipeline(transaction=False)
+    for device_key, devices in zip(device_keys, users_devices):
+        if not devices:
+            continue
+        pipe.unlink(*[f'{settings.REFRESH_KEY}{token_id.decode()}' for token_id in devices.values()])
+        pipe.hdel(device_key, *devices.keys())
+        revoked += len(devices)
 
-    for device, refresh in redis_client.hgetall(device_key).items():
-        token_id = refresh.decode('utf-8')
-        refresh_key = f'{settings.REFRESH_KEY}{token_id}'
-        redis_client.delete(refresh_key)
+    if revoked:
+        pipe.execute()
+    return revoked
 
-    redis_client.delete(device_key)
+
+def delete_all_tokens(user_id) -> int:
+    """
+    Удаляет refresh-токены всех устройств пользователя.
+
+    :return: количество удалённых токенов
+    """
+    return _delete_users_tokens([user_id])
+
+
+def revoke_users_tokens(user_ids: list):
+    """
+    Отзывает refresh-токены всех устройств у списка пользователей.
+
+    Пользователи обрабатываются пачками по BULK_REVOKE_BATCH_SIZE - два round trip'а на пачку,
+    между пачками пауза BULK_REVOKE_PAUSE, чтобы не занимать Redis целиком.
+    Генератор: после каждой пачки отдаёт прогресс.
+    """
+    total = len(user_ids)
+    revoked = 0
+
+    for start in range(0, total, settings.BULK_REVOKE_BATCH_SIZE):
+        batch = user_ids[start:start + settings.BULK_REVOKE_BATCH_SIZE]
+        revoked += _delete_users_tokens(batch)
+
+        processed = start + len(batch)
+        yield {
+            'processed': processed,
+            'total': total,
+            'revoked_tokens': revoked,
+        }
+        if processed < total:
+            time.sleep(settings.BULK_REVOKE_PAUSE)
+
+
+def touch_security_stamp(user_id):
+    """
+    Обновляет security stamp пользователя.
+
+    Вызывается при деактивации, смене пароля или данных, попадающих в токен.
+    Refresh-токены, выпущенные раньше этой отметки, при обновлении перепроверяются по базе.
+    Хранить отметку дольше жизни refresh-токена не нужно.
+    """
+    stamp_key = f'{settings.SECURITY_STAMP_KEY}{user_id}'
+    redis_client.setex(stamp_key, settings.REFRESH_TOKEN_EXP, time.time())
@@ -0,0 +1,79 @@
+"""
+Проверка JWT сервиса авторизации на стороне сервисов-потребителей (например, Async API).
+
+Модуль самодостаточен: зависит только от PyJWT и cryptography, его можно просто скопировать в другой сервис.
+Открытые ключи берутся из /.well-known/jwks.json и кешируются в памяти, поэтому проверка
+токена не требует сетевого запроса. JWKS перечитывается, когда истёк кеш
+или пришёл токен с незнакомым kid (не чаще min_refresh_interval).
+
+    verifier = TokenVerifier('http://auth.cinema.local/.well-known/jwks.json')
+    claims = verifier.verify(token)
+"""
+import json
+import threading
+import time
+import urllib.request
+from typing import List, Optional, Tuple
+
+import jwt
+from jwt.algorithms import get_default_algorithms
+
+
+class TokenVerifier:
+
+    def __init__(
+        self,
+        jwks_url: str,
+        algorithms: Optional[List[str]] = None,
+        cache_ttl: float = 600,
+        min_refresh_interval: float = 30,
+        timeout: float = 5,
+    ):
+        self.jwks_url = jwks_url
+        self.algorithms = algorithms or ['RS256', 'EdDSA']
+        self.cache_ttl = cache_ttl
+        self.min_refresh_interval = min_refresh_interval
+        self.timeout = timeout
+        self._keys = {}
+        # None - JWKS ещё ни разу не загружался.
+        self._fetched_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def _fetch(self):
+        with urllib.request.urlopen(self.jwks_url, timeout=self.timeout) as response:
+            jwks = json.load(response)
+
+        algorithms = get_default_algorithms()
+        keys = {}
+        for jwk in jwks.get('keys', []):
+            # Ключи с алгоритмами, которые мы не принимаем, пропускаем: токен с таким kid будет неизвестным.
+            if jwk.get('alg') not in self.algorithms or jwk['alg'] not in algorithms:
+                continue
+            keys[jwk['kid']] = (jwk['alg'], algorithms[jwk['alg']].from_jwk(json.dumps(jwk)))
+
+        self._keys = keys
+        self._fetched_at = time.monotonic()
+
+    def get_key(self, kid: str) -> Tuple[str, object]:
+        """Возвращает алгоритм ключа из JWKS и сам ключ."""
+        fetched_at = self._fetched_at
+        age = None if fetched_at is None else time.monotonic() - fetched_at
+
+        if age is None or age > self.cache_ttl or (kid not in self._keys and age > self.min_refresh_interval):
+            with self._lock:
+                # Пока ждали блокировку, ключи мог уже обновить другой поток.
+                if self._fetched_at == fetched_at:
+                    self._fetch()
+
+        key = self._keys.get(kid)
+        if key is None:
+            raise jwt.InvalidTokenError(f'Unknown signing key: {kid}')
+        return key
+
+    def verify(self, token: str, **options) -> dict:
+        """Проверяет подпись и срок действия токена, возвращает claims."""
+        kid = jwt.get_unverified_header(token).get('kid')
+        # Разрешён только алгоритм ключа из JWKS: токен с другим alg в заголовке отклоняется
+        # InvalidAlgorithmError (это InvalidTokenError), а не падает TypeError на чужом ключе.
+        algorithm, key = self.get_key(kid)
+        return jwt.decode(token, key, algorithms=[algorithm], **options)
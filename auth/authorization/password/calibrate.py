@@ -0,0 +1,71 @@
+import json
+import math
+import statistics
+import time
+
+import click
+from passlib.registry import get_crypt_handler
+
+from app_settings.settings import settings
+
+CALIBRATION_PASSWORD = 'Calibration-Password-123'
+
+
+def measure(handler, samples: int) -> float:
+    """Возвращает медианное время хеширования в секундах."""
+    timings = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        handler.hash(CALIBRATION_PASSWORD)
+        timings.append(time.perf_counter() - started)
+
+    return statistics.median(timings)
+
+
+def calibrate_scheme(scheme: str, target: float, samples: int, attempts: int = 4):
+    """
+    Подбирает rounds схемы так, чтобы хеширование занимало около target секунд.
+
+    Стоимость bcrypt растёт как 2^rounds, у pbkdf2 и argon2 (time_cost) - линейно.
+    """
+    handler = get_crypt_handler(scheme)
+    rounds = handler.default_rounds
+    elapsed = measure(handler.using(rounds=rounds), samples)
+
+    for _ in range(attempts):
+        elapsed = max(elapsed, 1e-6)
+        if handler.rounds_cost == 'log2':
+            new_rounds = rounds + round(math.log2(target / elapsed))
+        else:
+            new_rounds = round(rounds * target / elapsed)
+
+        new_rounds = min(max(new_rounds, handler.min_rounds), handler.max_rounds)
+        if new_rounds == rounds:
+            break
+
+        rounds = new_rounds
+        elapsed = measure(handler.using(rounds=rounds), samples)
+
+    return rounds, elapsed
+
+
+@click.command()
+@click.option('--target-ms', default=50, show_default=True, help='Target hashing latency in milliseconds.')
+@click.option('--samples', default=5, show_default=True, help='Hashes per measurement.')
+@click.option('--scheme', 'schemes', multiple=True, help='Schemes to calibrate. Defaults to PASSWORD_SCHEMES.')
+def calibrate(target_ms, samples, schemes):
+    """Замер скорости хеширования на текущей машине и подбор rounds под бюджет."""
+    target = target_ms / 1000
+    options = {}
+
+    for scheme in schemes or settings.PASSWORD_SCHEMES:
+        rounds, elapsed = calibrate_scheme(scheme, target, samples)
+        options[f'{scheme}__rounds'] = rounds
+        options[f'{scheme}__min_rounds'] = rounds
+        click.echo(f'{scheme}: rounds={rounds}, {elapsed * 1000:.1f} ms')
+
+    click.echo(f'PASSWORD_HASH_OPTIONS={json.dumps(options)}')
+
+
+if __name__ == '__main__':
+    calibrate()
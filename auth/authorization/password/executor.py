@@ -0,0 +1,53 @@
+from gevent import monkey
+from gevent.lock import BoundedSemaphore
+from gevent.threadpool import ThreadPool
+
+from app_settings.settings import settings
+
+
+class HashingBusyError(Exception):
+    """Очередь на хеширование паролей переполнена."""
+
+
+class HashingExecutor:
+    """
+    Пул для CPU-bound хеширования паролей.
+
+    PBKDF2 из hashlib отпускает GIL, поэтому нативные потоки gevent дают параллелизм по ядрам
+    и не замораживают остальные гринлеты воркера.
+    Очередь ограничена: если все слоты заняты дольше wait_timeout, запрос сразу получает отказ.
+    """
+
+    def __init__(self, workers: int, queue_size: int, wait_timeout: float):
+        self.workers = workers
+        self.wait_timeout = wait_timeout
+        self._slots = BoundedSemaphore(workers + queue_size)
+        self._pool = None
+
+    @property
+    def pool(self) -> ThreadPool:
+        # Пул создаётся лениво, чтобы у каждого воркера gunicorn после fork были свои потоки.
+        if self._pool is None:
+            self._pool = ThreadPool(self.workers)
+        return self._pool
+
+    def submit(self, func, *args, **kwargs):
+        """Выполняет func в пуле и возвращает результат, не блокируя event loop."""
+        # Вне gevent (например, flask run) хешируем в текущем потоке.
+        if not monkey.is_module_patched('socket'):
+            return func(*args, **kwargs)
+
+        if not self._slots.acquire(timeout=self.wait_timeout):
+            raise HashingBusyError('Password hashing queue is full')
+
+        try:
+            return self.pool.apply(func, args, kwargs)
+        finally:
+            self._slots.release()
+
+
+hashing_executor = HashingExecutor(
+    workers=settings.PASSWORD_HASH_WORKERS,
+    queue_size=settings.PASSWORD_HASH_QUEUE_SIZE,
+    wait_timeout=settings.PASSWORD_HASH_WAIT_TIMEOUT,
+)
@@ -1,15 +1,49 @@
-from passlib.hash import ldap_pbkdf2_sha512
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, List, Optional, Tuple
+
+from passlib.context import CryptContext
+
+from app_settings.settings import settings
+from authorization.password.executor import hashing_executor
+
+# Новые пароли хешируются первой схемой из PASSWORD_SCHEMES.
+# Хеши остальных схем (и хеши с устаревшей стоимостью) помечаются как требующие обновления.
+pwd_context = CryptContext(
+    schemes=settings.PASSWORD_SCHEMES,
+    deprecated='auto',
+    **settings.PASSWORD_HASH_OPTIONS,
+)
 
 
 def encrypt_password(password: str):
     """
-    Хеширует пароль.
+    Хеширует пароль по текущей политике pwd_context.
 
-    Выбрана ldap_pbkdf2_sha512 с функцией формирования ключа. Выглядит серьёзно. :)
+    Само хеширование выполняется в пуле hashing_executor.
     """
-    return ldap_pbkdf2_sha512.hash(password)
+    return hashing_executor.submit(pwd_context.hash, password)
+
+
+def encrypt_passwords(passwords: Iterable[str]) -> List[str]:
+    """
+    Хеширует пароли параллельно, не больше PASSWORD_HASH_WORKERS одновременно.
+
+    Под gevent потоки здесь становятся гринлетами, а хеширование уходит в пул hashing_executor;
+    без gevent хеширование идёт прямо в потоках, алгоритмы хеширования отпускают GIL.
+    """
+    with ThreadPoolExecutor(max_workers=settings.PASSWORD_HASH_WORKERS) as executor:
+        return list(executor.map(encrypt_password, passwords))
 
 
 def verify_password(password: str, hashed_password: str) -> bool:
     """Определяет соответствие пароля."""
-    return ldap_pbkdf2_sha512.verify(password, hashed_password)
+    return hashing_executor.submit(pwd_context.verify, password, hashed_password)
+
+
+def verify_and_update_password(password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    Проверяет пароль и, если хеш устарел по политике, возвращает новый хеш.
+
+    :return: (пароль верный, новый хеш или None)
+    """
+    return hashing_executor.submit(pwd_context.verify_and_update, password, hashed_password)
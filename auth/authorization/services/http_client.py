@@ -0,0 +1,146 @@
+import logging
+import random
+import threading
+import time
+from http import HTTPStatus
+from typing import Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from app_settings.settings import settings
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = {HTTPStatus.BAD_GATEWAY, HTTPStatus.SERVICE_UNAVAILABLE, HTTPStatus.GATEWAY_TIMEOUT}
+
+
+class ProviderUnavailableError(Exception):
+    """OAuth-провайдер не отвечает или отключён circuit breaker'ом."""
+
+
+class CircuitBreaker:
+    """
+    Размыкатель цепи для внешнего сервиса.
+
+    После failure_threshold ошибок подряд запросы сразу отклоняются reset_timeout секунд,
+    затем пропускается один пробный запрос: успех замыкает цепь, ошибка снова размыкает.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                # Пробный запрос: до его результата остальные запросы снова ждут reset_timeout.
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+    @property
+    def state(self) -> str:
+        return 'closed' if self.opened_at is None else 'open'
+
+
+class ProviderClient:
+    """
+    HTTP-клиент одного OAuth-провайдера.
+
+    Соединения переиспользуются через общий requests.Session, у запросов есть таймауты на соединение и чтение.
+    Сетевые ошибки и 502/503/504 повторяются с экспоненциальной задержкой и джиттером.
+    Неидемпотентные запросы (по умолчанию все, кроме GET) повторяются только при таймауте соединения,
+    когда запрос точно не ушёл. Обмен одноразового кода на токен нужно явно помечать idempotent=False.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.timeout = (settings.OAUTH_HTTP_CONNECT_TIMEOUT, settings.OAUTH_HTTP_READ_TIMEOUT)
+        self.retries = settings.OAUTH_HTTP_RETRIES
+        self.backoff = settings.OAUTH_HTTP_BACKOFF
+        self.breaker = CircuitBreaker(settings.OAUTH_CIRCUIT_FAILURES, settings.OAUTH_CIRCUIT_RESET_TIMEOUT)
+
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings.OAUTH_HTTP_POOL_SIZE)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    @staticmethod
+    def _can_retry(idempotent: bool, error: Exception = None, response: requests.Response = None) -> bool:
+        if response is not None:
+            return idempotent and response.status_code in RETRY_STATUSES
+        return idempotent or isinstance(error, requests.exceptions.ConnectTimeout)
+
+    def request(self, method: str, url: str, idempotent: Optional[bool] = None, **kwargs) -> requests.Response:
+        """
+        :param idempotent: можно ли повторять запрос, который мог дойти до провайдера; по умолчанию - только GET
+        """
+        if not self.breaker.allow():
+            raise ProviderUnavailableError(f'{self.name} is unavailable')
+
+        method = method.upper()
+        if idempotent is None:
+            idempotent = method == 'GET'
+        kwargs.setdefault('timeout', self.timeout)
+
+        for attempt in range(self.retries + 1):
+            error, response = None, None
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except requests.exceptions.RequestException as request_error:
+                error = request_error
+
+            failed = error is not None or response.status_code >= HTTPStatus.INTERNAL_SERVER_ERROR
+            if not failed:
+                self.breaker.record_success()
+                return response
+
+            if attempt == self.retries or not self._can_retry(idempotent, error, response):
+                break
+
+            delay = self.backoff * 2 ** attempt * random.uniform(0.5, 1.5)
+            logger.warning('%s %s failed (%s), retry in %.2fs', method, url, error or response.status_code, delay)
+            time.sleep(delay)
+
+        self.breaker.record_failure()
+        if error is not None:
+            raise ProviderUnavailableError(f'{self.name} request failed: {error}') from error
+        return response
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request('POST', url, **kwargs)
+
+
+_clients: Dict[str, ProviderClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(name: str) -> ProviderClient:
+    """Клиент провайдера, один на процесс: пул соединений и состояние circuit breaker'а общие для всех запросов."""
+    client = _clients.get(name)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(name)
+            if client is None:
+                client = _clients[name] = ProviderClient(name)
+    return client
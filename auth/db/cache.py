@@ -0,0 +1,114 @@
+import json
+import uuid
+from typing import Iterable, List
+
+from app_settings.settings import settings
+from db.no_sql import redis_client
+from db.queries import get_active_user_roles
+from db.routing import primary
+from utils.cache import LocalCache
+
+# KEYS: роли пользователя, версия ролей пользователя. ARGV: версия до чтения из базы, ttl, роли.
+# Роли записываются, только если за время чтения из базы их никто не сбросил.
+FILL_ROLES_SCRIPT = """
+if (redis.call('GET', KEYS[2]) or '0') ~= ARGV[1] then
+    return 0
+end
+redis.call('SETEX', KEYS[1], ARGV[2], ARGV[3])
+return 1
+"""
+
+_fill_roles_script = redis_client.register_script(FILL_ROLES_SCRIPT)
+
+
+class RolesCache:
+    """
+    Кеш активных ролей пользователя.
+
+    Два уровня: LRU в памяти воркера с коротким TTL и Redis с длинным.
+    При изменении ролей записи удаляются из Redis и из памяти текущего воркера,
+    остальные воркеры увидят изменения не позже чем через ROLES_CACHE_LOCAL_TTL.
+
+    invalidate() ещё и увеличивает версию ролей пользователя. Промах запоминает версию до чтения из базы
+    и записывает роли в Redis, только если версия не изменилась: иначе роли, прочитанные до отзыва,
+    остались бы в кеше на весь ROLES_CACHE_TTL.
+    """
+
+    def __init__(self):
+        self.local = LocalCache(maxsize=settings.ROLES_CACHE_LOCAL_SIZE, ttl=settings.ROLES_CACHE_LOCAL_TTL)
+        self.redis_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _key(user_id) -> str:
+        # id приходит и как UUID из модели, и как строка из формы - приводим к одному виду.
+        return f'{settings.ROLES_CACHE_KEY}{uuid.UUID(str(user_id))}'
+
+    @staticmethod
+    def _version_key(user_id) -> str:
+        return f'{settings.ROLES_CACHE_VERSION_KEY}{uuid.UUID(str(user_id))}'
+
+    def get(self, user_id) -> List[dict]:
+        """Возвращает активные роли пользователя в виде [{'id', 'name', 'description'}]."""
+        key = self._key(user_id)
+
+        roles = self.local.get(key)
+        if roles is not None:
+            return roles
+
+        version_key = self._version_key(user_id)
+        cached, version = redis_client.mget(key, version_key)
+        if cached is not None:
+            self.redis_hits += 1
+            roles = json.loads(cached)
+        else:
+            self.misses += 1
+            # Кеш заполняем из основной базы: устаревшие роли с реплики прожили бы в нём весь TTL.
+            with primary():
+                roles = [{
+                    'id': str(role.id),
+                    'name': role.name,
+                    'description': role.description,
+                } for role in get_active_user_roles(user_id)]
+            filled = _fill_roles_script(
+                keys=[key, version_key],
+                args=[version or '0', settings.ROLES_CACHE_TTL, json.dumps(roles)],
+            )
+            if not filled:
+                # Роли сбросили, пока мы читали базу: прочитанное могло устареть, в кеш его не кладём.
+                return roles
+
+        self.local.set(key, roles)
+        return roles
+
+    def invalidate(self, user_ids: Iterable):
+        user_ids = list(user_ids)
+        keys = [self._key(user_id) for user_id in user_ids]
+        if not keys:
+            return
+
+        for key in keys:
+            self.local.delete(key)
+
+        pipe = redis_client.pipeline()
+        for user_id in user_ids:
+            version_key = self._version_key(user_id)
+            pipe.incr(version_key)
+            pipe.expire(version_key, settings.ROLES_CACHE_TTL)
+        pipe.delete(*keys)
+        pipe.execute()
+        self.invalidations += len(keys)
+
+    def stats(self) -> dict:
+        local_stats = self.local.stats()
+        return {
+            'local_size': local_stats['size'],
+            'local_hits': local_stats['hits'],
+            'redis_hits': self.redis_hits,
+            'misses': self.misses,
+            'invalidations': self.invalidations,
+        }
+
+
+roles_cache = RolesCache()
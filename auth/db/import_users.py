@@ -0,0 +1,23 @@
+import csv
+
+import click
+
+from authorization.forms.registration import bulk_register
+
+
+@click.command()
+@click.argument('csv_file', type=click.File('r'))
+def import_users(csv_file):
+    """Регистрирует пользователей из csv с колонками email и password."""
+    result = bulk_register(csv.DictReader(csv_file))
+
+    for email, errors in result['errors'].items():
+        click.echo(f'{email}: {"; ".join(errors)}', err=True)
+    click.echo(f'Created: {result["created"]}, skipped: {len(result["errors"])}')
+
+
+if __name__ == '__main__':
+    from app import main
+
+    with main().app_context():
+        import_users()
@@ -1,12 +1,22 @@
 from flask import Flask
-from flask_sqlalchemy import SQLAlchemy
 
 from app_settings.settings import settings
+from db.pool import InstrumentedQueuePool, make_psycopg2_green
+from db.routing import RoutingSQLAlchemy, replica_router
 
-db = SQLAlchemy()
+db = RoutingSQLAlchemy()
 
 
 def init_db(app: Flask):
     app.config['SQLALCHEMY_DATABASE_URI'] = settings.DATABASE_URL
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'poolclass': InstrumentedQueuePool,
+        'pool_size': settings.DB_POOL_SIZE,
+        'max_overflow': settings.DB_POOL_MAX_OVERFLOW,
+        'pool_timeout': settings.DB_POOL_TIMEOUT,
+        'pool_recycle': settings.DB_POOL_RECYCLE,
+        'pool_pre_ping': settings.DB_POOL_PRE_PING,
+    }
+    make_psycopg2_green()
     db.init_app(app)
-
+    replica_router.init_app(app.config['SQLALCHEMY_ENGINE_OPTIONS'])
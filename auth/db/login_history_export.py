@@ -0,0 +1,39 @@
+import sys
+from datetime import datetime
+
+import click
+
+from authorization.forms.login_history import EXPORT_FORMATS, export_login_history, filter_login_history
+from db.models import User
+
+
+def parse_date(ctx, param, value):
+    if value is None:
+        return None
+    try:
+        return datetime.strptime(value, '%d-%m-%Y').date()
+    except ValueError:
+        raise click.BadParameter('expected DD-MM-YYYY')
+
+
+@click.command()
+@click.argument('email')
+@click.option('--date-from', callback=parse_date, help='DD-MM-YYYY')
+@click.option('--date-to', callback=parse_date, help='DD-MM-YYYY')
+@click.option('--format', 'export_format', default='csv', show_default=True, type=click.Choice(EXPORT_FORMATS))
+@click.option('--output', type=click.File('w'), default=sys.stdout, help='File to write to, stdout by default.')
+def export(email, date_from, date_to, export_format, output):
+    """Выгружает историю входов пользователя в csv или ndjson."""
+    user = User.query.filter_by(email=email).first()
+    if not user:
+        raise click.ClickException(f'User {email} not found')
+
+    for chunk in export_login_history(filter_login_history(user.id, date_from, date_to), export_format):
+        output.write(chunk)
+
+
+if __name__ == '__main__':
+    from app import main
+
+    with main().app_context():
+        export()
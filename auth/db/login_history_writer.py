@@ -0,0 +1,228 @@
+import atexit
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from redis.exceptions import ResponseError
+from sqlalchemy.dialects.postgresql import insert
+
+from app_settings.settings import settings
+from db.initial import db
+from db.models import LoginHistory
+from db.no_sql import redis_client
+
+logger = logging.getLogger(__name__)
+
+
+def push_login_event(login_data: dict) -> dict:
+    """
+    Кладёт событие входа в Redis Stream вместо синхронной записи в Postgres.
+
+    id и created_at назначаются сразу: при повторной доставке та же запись не вставится дважды.
+    """
+    # Значения приходят из заголовков клиента: слишком длинное значение уронило бы INSERT всей пачки.
+    event = LoginHistory.fit_string_fields({
+        'id': str(uuid.uuid4()),
+        'created_at': datetime.utcnow().isoformat(),
+        **login_data,
+        'user_id': str(login_data['user_id']),
+    })
+    redis_client.xadd(
+        settings.LOGIN_HISTORY_STREAM,
+        {'data': json.dumps(event)},
+        maxlen=settings.LOGIN_HISTORY_STREAM_MAXLEN,
+        approximate=True,
+    )
+    return event
+
+
+class LoginHistoryWriter:
+    """
+    Фоновая запись событий входа из Redis Stream в login_history пачками.
+
+    Пачка пишется одним многострочным INSERT, когда набралось LOGIN_HISTORY_BATCH_SIZE событий
+    или прошло LOGIN_HISTORY_FLUSH_INTERVAL_MS. Событие подтверждается (XACK) только после commit,
+    а записи, зависшие у упавших воркеров, забираются через XAUTOCLAIM - доставка at-least-once.
+    """
+
+    def __init__(self):
+        self.consumer = None
+        self.batch_size = settings.LOGIN_HISTORY_BATCH_SIZE
+        self.flush_interval = settings.LOGIN_HISTORY_FLUSH_INTERVAL_MS / 1000
+        self.app = None
+        self._thread = None
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+
+    def _ensure_group(self):
+        try:
+            redis_client.xgroup_create(
+                settings.LOGIN_HISTORY_STREAM, settings.LOGIN_HISTORY_GROUP, id='0', mkstream=True
+            )
+        except ResponseError as error:
+            if 'BUSYGROUP' not in str(error):
+                raise
+
+    def _read(self, stream_id: str, count: int, block_ms: int = None) -> list:
+        response = redis_client.xreadgroup(
+            settings.LOGIN_HISTORY_GROUP,
+            self.consumer,
+            {settings.LOGIN_HISTORY_STREAM: stream_id},
+            count=count,
+            block=block_ms,
+        )
+        return response[0][1] if response else []
+
+    def _ack(self, entry_ids: list):
+        pipe = redis_client.pipeline()
+        pipe.xack(settings.LOGIN_HISTORY_STREAM, settings.LOGIN_HISTORY_GROUP, *entry_ids)
+        pipe.xdel(settings.LOGIN_HISTORY_STREAM, *entry_ids)
+        pipe.execute()
+
+    def _move_to_dead_letter(self):
+        """
+        Переносит в LOGIN_HISTORY_DEAD_LETTER_STREAM свои события,
+        доставленные больше LOGIN_HISTORY_MAX_DELIVERIES раз.
+        """
+        pending = redis_client.xpending_range(
+            settings.LOGIN_HISTORY_STREAM,
+            settings.LOGIN_HISTORY_GROUP,
+            min='-',
+            max='+',
+            count=self.batch_size,
+            consumername=self.consumer,
+        )
+        entry_ids = [
+            entry['message_id'] for entry in pending if entry['times_delivered'] > settings.LOGIN_HISTORY_MAX_DELIVERIES
+        ]
+        if not entry_ids:
+            return
+
+        pipe = redis_client.pipeline()
+        for entry_id in entry_ids:
+            for _, fields in redis_client.xrange(settings.LOGIN_HISTORY_STREAM, min=entry_id, max=entry_id):
+                pipe.xadd(settings.LOGIN_HISTORY_DEAD_LETTER_STREAM, fields)
+        pipe.execute()
+        self._ack(entry_ids)
+        logger.error('%s login history events moved to %s', len(entry_ids), settings.LOGIN_HISTORY_DEAD_LETTER_STREAM)
+
+    def _collect(self) -> list:
+        """Собирает пачку: свои неподтверждённые, чужие зависшие, затем новые события."""
+        self._move_to_dead_letter()
+        entries = self._read('0', self.batch_size)
+
+        if len(entries) < self.batch_size:
+            claimed = redis_client.xautoclaim(
+                settings.LOGIN_HISTORY_STREAM,
+                settings.LOGIN_HISTORY_GROUP,
+                self.consumer,
+                min_idle_time=settings.LOGIN_HISTORY_CLAIM_IDLE_MS,
+                count=self.batch_size - len(entries),
+            )
+            entries.extend(entry for entry in claimed[1] if entry[1])
+
+        deadline = time.monotonic() + self.flush_interval
+        while len(entries) < self.batch_size and not self._stopped.is_set():
+            block_ms = int((deadline - time.monotonic()) * 1000)
+            if block_ms <= 0:
+                break
+            entries.extend(self._read('>', self.batch_size - len(entries), block_ms))
+
+        return entries
+
+    @staticmethod
+    def _insert(rows: list):
+        db.session.execute(insert(LoginHistory.__table__).values(rows).on_conflict_do_nothing())
+        db.session.commit()
+
+    def _write(self, entries: list) -> int:
+        """
+        Пишет пачку одним INSERT. Если он не прошёл, пишет события по одному:
+        неподтверждёнными остаются только сломанные, они перечитаются и со временем уйдут в dead letter.
+        """
+        rows, entry_ids, empty_ids = [], [], []
+        for entry_id, fields in entries:
+            if not fields:
+                empty_ids.append(entry_id)
+                continue
+            event = json.loads(fields[b'data'])
+            event['created_at'] = datetime.fromisoformat(event['created_at'])
+            rows.append(event)
+            entry_ids.append(entry_id)
+
+        written_ids = empty_ids
+        with self.app.app_context():
+            try:
+                if rows:
+                    self._insert(rows)
+                written_ids += entry_ids
+            except Exception:
+                db.session.rollback()
+                logger.exception('Failed to write login history batch, writing events one by one')
+                for entry_id, row in zip(entry_ids, rows):
+                    try:
+                        self._insert([row])
+                        written_ids.append(entry_id)
+                    except Exception:
+                        db.session.rollback()
+                        logger.exception('Failed to write login history event %s', entry_id)
+
+        if written_ids:
+            self._ack(written_ids)
+        return len(written_ids)
+
+    def flush(self) -> int:
+        """Записывает одну пачку. Возвращает количество записанных событий."""
+        with self._lock:
+            entries = self._collect()
+            return self._write(entries) if entries else 0
+
+    def run(self):
+        # Имя получателя задаём здесь: воркеры gunicorn получают свой pid уже после fork.
+        self.consumer = f'{socket.gethostname()}-{os.getpid()}'
+        self._ensure_group()
+        while not self._stopped.is_set():
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Failed to write login history batch')
+                with self.app.app_context():
+                    db.session.rollback()
+                time.sleep(1)
+
+    def start(self, app):
+        """Запускает запись в фоне текущего процесса (под gevent - в гринлете)."""
+        if self._thread is not None:
+            return
+
+        self.app = app
+        self._thread = threading.Thread(target=self.run, name='login-history-writer', daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        """Останавливает фоновую запись и дописывает всё, что успело накопиться."""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval * 2)
+        try:
+            while self.flush():
+                pass
+        except Exception:
+            logger.exception('Failed to flush login history on shutdown')
+
+
+login_history_writer = LoginHistoryWriter()
+
+
+if __name__ == '__main__':
+    # Отдельный процесс-писатель, если запись в воркерах отключена LOGIN_HISTORY_WRITER_IN_PROCESS=False.
+    from app import main
+
+    login_history_writer.app = main()
+    login_history_writer.run()
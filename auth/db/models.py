@@ -46,6 +46,7 @@ class LoginHistory(db.Model):
     __tablename__ = 'login_history'
     __table_args__ = (
         UniqueConstraint('id', 'created_at'),
+        db.Index('ix_login_history_user_id_created_at', 'user_id', 'created_at'),
         {
             'postgresql_partition_by': 'RANGE (created_at)',
         }
@@ -59,6 +60,18 @@ class LoginHistory(db.Model):
     browser = db.Column(db.String(255), nullable=False, default='')
     ip4 = db.Column(db.String(255), nullable=False, default='')
 
+    # Строковые колонки, значения которых приходят из заголовков клиента.
+    STRING_FIELDS = ('user_agent', 'platform', 'browser', 'ip4')
+
+    @classmethod
+    def fit_string_fields(cls, values: dict) -> dict:
+        """Обрезает строковые поля по длине их колонок: слишком длинное значение уронило бы INSERT."""
+        fitted = {
+            field: str(values.get(field) or '')[:cls.__table__.c[field].type.length]
+            for field in cls.STRING_FIELDS
+        }
+        return {**values, **fitted}
+
 
 class Role(db.Model):
     __tablename__ = 'roles'
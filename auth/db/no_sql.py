@@ -2,4 +2,15 @@ import redis
 
 from app_settings.settings import settings
 
-redis_client = redis.Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT, db=0)
+# Общий на процесс пул соединений: им пользуются и хранилище токенов, и лимитер запросов.
+redis_pool = redis.BlockingConnectionPool(
+    host=settings.REDIS_HOST,
+    port=settings.REDIS_PORT,
+    db=0,
+    max_connections=settings.REDIS_POOL_SIZE,
+    timeout=settings.REDIS_POOL_TIMEOUT,
+    socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+    socket_connect_timeout=settings.REDIS_SOCKET_CONNECT_TIMEOUT,
+)
+
+redis_client = redis.Redis(connection_pool=redis_pool)
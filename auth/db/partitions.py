@@ -0,0 +1,179 @@
+import logging
+import re
+import threading
+from datetime import date, datetime, timedelta
+from typing import List, Optional
+
+import click
+from sqlalchemy import text
+
+from app_settings.settings import settings
+from db.initial import db
+from db.no_sql import redis_client
+
+logger = logging.getLogger(__name__)
+
+PARENT_TABLE = 'login_history'
+BOUND_RE = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+
+
+def quarter_start(day: date) -> date:
+    return date(day.year, (day.month - 1) // 3 * 3 + 1, 1)
+
+
+def next_quarter(day: date) -> date:
+    if day.month >= 10:
+        return date(day.year + 1, 1, 1)
+    return date(day.year, day.month + 3, 1)
+
+
+def get_partitions() -> List[dict]:
+    """Возвращает партиции login_history с границами и размером, от старых к новым."""
+    rows = db.session.execute(text("""
+        SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), pg_total_relation_size(c.oid)
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = CAST(:parent AS regclass)
+    """), {'parent': PARENT_TABLE})
+
+    partitions = []
+    for name, bound, size in rows:
+        match = BOUND_RE.search(bound)
+        if not match:
+            continue
+        partitions.append({
+            'name': name,
+            'from': datetime.fromisoformat(match.group(1)).date(),
+            'to': datetime.fromisoformat(match.group(2)).date(),
+            'size': size,
+        })
+
+    return sorted(partitions, key=lambda partition: partition['from'])
+
+
+def create_future_partitions(today: Optional[date] = None, ahead: int = None) -> List[str]:
+    """Создаёт квартальные партиции с текущего квартала на ahead кварталов вперёд, если их ещё нет."""
+    today = today or datetime.utcnow().date()
+    ahead = settings.LOGIN_HISTORY_PARTITIONS_AHEAD if ahead is None else ahead
+    partitions = get_partitions()
+
+    created = []
+    start = quarter_start(today)
+    for _ in range(ahead + 1):
+        end = next_quarter(start)
+        covered = any(p['from'] < end and start < p['to'] for p in partitions)
+
+        if not covered:
+            name = f'{PARENT_TABLE}_y{start.year}q{(start.month - 1) // 3 + 1}'
+            db.session.execute(text(f"""
+                CREATE TABLE IF NOT EXISTS "{name}"
+                PARTITION OF "{PARENT_TABLE}"
+                FOR VALUES FROM ('{start}') TO ('{end}');
+                CREATE INDEX IF NOT EXISTS "{name}_created_at_idx" ON "{name}" (created_at);
+            """))
+            created.append(name)
+
+        start = end
+
+    db.session.commit()
+    return created
+
+
+def remove_old_partitions(today: Optional[date] = None, retention_days: int = None) -> List[str]:
+    """
+    Отсоединяет партиции, целиком вышедшие за срок хранения.
+
+    Если задана LOGIN_HISTORY_ARCHIVE_SCHEMA, партиция переносится туда, иначе удаляется.
+    """
+    today = today or datetime.utcnow().date()
+    retention_days = settings.LOGIN_HISTORY_RETENTION_DAYS if retention_days is None else retention_days
+    if not retention_days:
+        return []
+
+    border = today - timedelta(days=retention_days)
+    archive_schema = settings.LOGIN_HISTORY_ARCHIVE_SCHEMA
+
+    removed = []
+    for partition in get_partitions():
+        if partition['to'] > border:
+            continue
+
+        name = partition['name']
+        db.session.execute(text(f'ALTER TABLE "{PARENT_TABLE}" DETACH PARTITION "{name}"'))
+        if archive_schema:
+            db.session.execute(text(f'CREATE SCHEMA IF NOT EXISTS "{archive_schema}"'))
+            db.session.execute(text(f'ALTER TABLE "{name}" SET SCHEMA "{archive_schema}"'))
+        else:
+            db.session.execute(text(f'DROP TABLE "{name}"'))
+        removed.append(name)
+
+    db.session.commit()
+    return removed
+
+
+def maintain_partitions() -> dict:
+    return {
+        'created': create_future_partitions(),
+        'removed': remove_old_partitions(),
+    }
+
+
+def run_maintenance_once() -> Optional[dict]:
+    """
+    Обслуживание партиций, если за этот интервал его ещё никто не делал.
+
+    Блокировка в Redis нужна, чтобы из всех воркеров работу делал один.
+    """
+    lock_key = f'{PARENT_TABLE}::partitions::lock'
+    if not redis_client.set(lock_key, 1, nx=True, ex=settings.LOGIN_HISTORY_PARTITIONS_INTERVAL):
+        return None
+
+    result = maintain_partitions()
+    logger.info('login_history partitions maintained: %s', result)
+    return result
+
+
+def start_maintenance_schedule(app):
+    """Запускает периодическое обслуживание партиций в фоне текущего процесса."""
+    interval = settings.LOGIN_HISTORY_PARTITIONS_INTERVAL
+
+    def run():
+        stopped = threading.Event()
+        while not stopped.wait(interval):
+            try:
+                with app.app_context():
+                    run_maintenance_once()
+            except Exception:
+                logger.exception('Failed to maintain login_history partitions')
+
+    thread = threading.Thread(target=run, name='login-history-partitions', daemon=True)
+    thread.start()
+    return thread
+
+
+@click.group()
+def cli():
+    """Обслуживание партиций login_history."""
+
+
+@cli.command()
+def maintain():
+    """Создаёт будущие партиции и убирает партиции старше срока хранения."""
+    result = maintain_partitions()
+    click.echo(f'Created: {", ".join(result["created"]) or "-"}')
+    click.echo(f'Removed: {", ".join(result["removed"]) or "-"}')
+
+
+@cli.command()
+def report():
+    """Показывает партиции, их границы и размер."""
+    for partition in get_partitions():
+        size_mb = partition['size'] / 1024 / 1024
+        click.echo(f'{partition["name"]:<30} {partition["from"]} - {partition["to"]} {size_mb:>10.2f} MB')
+
+
+if __name__ == '__main__':
+    from app import main
+
+    with main().app_context():
+        cli()
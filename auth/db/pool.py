@@ -0,0 +1,88 @@
+import threading
+import time
+
+import psycopg2
+from psycopg2 import extensions
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+
+def gevent_wait_callback(conn, timeout=None):
+    """Ожидание ответа Postgres через хаб gevent, а не блокирующим вызовом libpq (как в psycogreen)."""
+    from gevent.socket import wait_read, wait_write
+
+    while True:
+        state = conn.poll()
+        if state == extensions.POLL_OK:
+            break
+        elif state == extensions.POLL_READ:
+            wait_read(conn.fileno(), timeout=timeout)
+        elif state == extensions.POLL_WRITE:
+            wait_write(conn.fileno(), timeout=timeout)
+        else:
+            raise psycopg2.OperationalError(f'Bad result from poll: {state!r}')
+
+
+def make_psycopg2_green() -> bool:
+    """
+    Включает кооперативный psycopg2, если процесс работает под gevent.
+
+    :return: True, если wait callback установлен
+    """
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+
+    if not monkey.is_module_patched('socket'):
+        return False
+
+    extensions.set_wait_callback(gevent_wait_callback)
+    return True
+
+
+class PoolStats:
+    """Счётчики выдачи соединений из пула: сколько раз брали, сколько ждали и сколько раз не дождались."""
+
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, wait: float, timed_out: bool = False):
+        with self._lock:
+            self.checkouts += 1
+            self.timeouts += timed_out
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+
+    def stats(self, pool: QueuePool) -> dict:
+        return {
+            'size': pool.size(),
+            'checked_out': pool.checkedout(),
+            'checked_in': pool.checkedin(),
+            'overflow': pool.overflow(),
+            'checkouts': self.checkouts,
+            'timeouts': self.timeouts,
+            'wait_avg_ms': round(self.wait_total / self.checkouts * 1000, 3) if self.checkouts else 0,
+            'wait_max_ms': round(self.wait_max * 1000, 3),
+        }
+
+
+pool_stats = PoolStats()
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool, который замеряет время ожидания свободного соединения."""
+
+    def _do_get(self):
+        started = time.monotonic()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            pool_stats.record(time.monotonic() - started, timed_out=True)
+            raise
+        pool_stats.record(time.monotonic() - started)
+        return connection
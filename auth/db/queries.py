@@ -1,28 +1,74 @@
-from db.models import Role, RoleRelation, SocialRelation, SocialNetwork
+import uuid
+
+from flask import g
+
+from db.initial import db
+from db.models import RoleRelation, SocialRelation
+from db.reference import reference_cache
 
 
 def get_active_user_roles(user_id):
-    """Возвращает активные роли пользователя."""
-    active_roles_relation = RoleRelation.query \
+    """Возвращает активные роли пользователя. Сами роли берутся из справочника в памяти."""
+    role_ids = RoleRelation.query \
         .with_entities(RoleRelation.role_id) \
         .filter(RoleRelation.user_id == user_id) \
-        .filter(RoleRelation.finish_at == None)
+        .filter(RoleRelation.finish_at == None) \
+        .distinct()
+
+    return reference_cache.get_roles(role_id for role_id, in role_ids)
+
 
-    roles_query = Role.query.filter(
-        Role.id.in_(active_roles_relation)
-    ).all()
+def get_role_user_ids(role_id) -> list:
+    """Возвращает id пользователей, у которых активна роль."""
+    user_ids = RoleRelation.query \
+        .with_entities(RoleRelation.user_id) \
+        .filter(RoleRelation.role_id == role_id) \
+        .filter(RoleRelation.finish_at == None) \
+        .distinct()
 
-    return roles_query
+    return [user_id for user_id, in user_ids]
 
 
 def get_social_networks(user_id):
-    """Возвращает все социальные сети пользователя."""
-    relations = SocialRelation.query \
+    """Возвращает все социальные сети пользователя. Сами соцсети берутся из справочника в памяти."""
+    social_ids = SocialRelation.query \
         .with_entities(SocialRelation.social_id) \
         .filter(SocialRelation.user_id == user_id)
 
-    roles_query = SocialNetwork.query.filter(
-        SocialNetwork.id.in_(relations)
-    ).all()
+    networks = (reference_cache.get_network(social_id) for social_id, in social_ids)
+    return [network for network in networks if network is not None]
+
+
+def get_approximate_count(query) -> int:
+    """Оценка количества строк запроса по плану Postgres, без COUNT(*) по всем партициям."""
+    compiled = query.order_by(None).statement.compile(dialect=db.engine.dialect)
+    plan = db.session.connection().exec_driver_sql(
+        f'EXPLAIN (FORMAT JSON) {compiled}', compiled.params
+    ).scalar()
+
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def exists(query) -> bool:
+    """SELECT EXISTS(...) вместо COUNT(*): Postgres останавливается на первой найденной строке."""
+    return db.session.query(query.exists()).scalar()
+
+
+def get_entity(model, entity_id):
+    """
+    Загружает запись по первичному ключу не больше одного раза за запрос.
+
+    Валидаторы формы и её обработчик получают один и тот же объект без повторного SELECT.
+    Невалидный UUID даёт None без обращения к базе.
+    """
+    try:
+        entity_id = uuid.UUID(str(entity_id))
+    except ValueError:
+        return None
+
+    entities = g.setdefault('_loaded_entities', {})
+    key = (model, entity_id)
+    if key not in entities:
+        entities[key] = db.session.get(model, entity_id)
 
-    return roles_query
+    return entities[key]
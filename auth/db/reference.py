@@ -0,0 +1,170 @@
+import logging
+import threading
+import time
+import uuid
+from typing import Dict, List, NamedTuple, Optional
+
+from sqlalchemy import event
+
+from app_settings.settings import settings
+from db.initial import db
+from db.models import Role, SocialNetwork
+from db.no_sql import redis_client
+from db.routing import primary
+
+logger = logging.getLogger(__name__)
+
+
+class ReferenceRow(NamedTuple):
+    id: object
+    name: str
+    description: str
+
+
+class ReferenceData(NamedTuple):
+    roles_by_id: Dict[str, ReferenceRow]
+    roles_by_name: Dict[str, ReferenceRow]
+    networks_by_id: Dict[str, ReferenceRow]
+    networks_by_name: Dict[str, ReferenceRow]
+
+
+def _index(rows: List[ReferenceRow]):
+    return {str(row.id): row for row in rows}, {row.name: row for row in rows}
+
+
+class ReferenceCache:
+    """
+    Справочники ролей и социальных сетей в памяти процесса.
+
+    Таблицы маленькие и меняются редко, поэтому загружаются целиком.
+    После изменения справочника invalidate() публикует сообщение в REFERENCE_CACHE_CHANNEL,
+    и все воркеры перечитывают данные при следующем обращении.
+    REFERENCE_CACHE_TTL страхует на случай пропущенного сообщения.
+
+    Каждый сброс увеличивает _generation. Загрузка, во время которой был сброс,
+    могла прочитать данные до изменения, поэтому её результат не сохраняется.
+    """
+
+    def __init__(self):
+        self._data: Optional[ReferenceData] = None
+        self._loaded_at = 0.0
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._listener = None
+
+    def _load(self) -> ReferenceData:
+        with primary():
+            roles = [ReferenceRow(role.id, role.name, role.description) for role in Role.query.all()]
+            networks = [
+                ReferenceRow(network.id, network.name, network.description) for network in SocialNetwork.query.all()
+            ]
+
+        return ReferenceData(*_index(roles), *_index(networks))
+
+    @property
+    def data(self) -> ReferenceData:
+        data = self._data
+        if data is not None and time.monotonic() - self._loaded_at < settings.REFERENCE_CACHE_TTL:
+            return data
+
+        with self._lock:
+            self._start_listener()
+            if self._data is not data and self._data is not None:
+                return self._data
+            return self._reload()
+
+    def _reload(self) -> ReferenceData:
+        # Вызывается под self._lock.
+        while True:
+            generation = self._generation
+            data = self._load()
+            if generation == self._generation:
+                self._data = data
+                self._loaded_at = time.monotonic()
+                return data
+
+    def _reset(self):
+        self._generation += 1
+        self._data = None
+
+    def reload(self) -> ReferenceData:
+        """Перечитывает справочники сразу, не дожидаясь сообщения об изменении."""
+        with self._lock:
+            self._start_listener()
+            return self._reload()
+
+    def _listen(self):
+        while True:
+            pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(settings.REFERENCE_CACHE_CHANNEL)
+                # Пока не были подписаны, сообщения могли потеряться.
+                self._reset()
+                while True:
+                    if pubsub.get_message(timeout=1.0) is not None:
+                        self._reset()
+            except Exception:
+                logger.exception('Reference cache listener failed')
+                time.sleep(1)
+            finally:
+                pubsub.close()
+
+    def _start_listener(self):
+        # Поток запускается при первом обращении, чтобы у каждого воркера gunicorn после fork был свой.
+        if self._listener is None:
+            self._listener = threading.Thread(target=self._listen, name='reference-cache-listener', daemon=True)
+            self._listener.start()
+
+    def invalidate(self):
+        """Сбрасывает справочники во всех воркерах. Вызывается после commit изменений."""
+        self._reset()
+        redis_client.publish(settings.REFERENCE_CACHE_CHANNEL, 'changed')
+
+    def roles(self) -> List[ReferenceRow]:
+        return list(self.data.roles_by_id.values())
+
+    def get_role(self, role_id) -> Optional[ReferenceRow]:
+        return self.data.roles_by_id.get(str(role_id))
+
+    def get_roles(self, role_ids) -> List[ReferenceRow]:
+        """
+        Роли по списку id.
+
+        Если какой-то роли нет в справочнике, он мог устареть: роль создана в другом воркере,
+        а сообщение ещё не дошло. Тогда справочник перечитывается один раз.
+        """
+        role_ids = [str(role_id) for role_id in role_ids]
+        roles_by_id = self.data.roles_by_id
+        if any(role_id not in roles_by_id for role_id in role_ids):
+            roles_by_id = self.reload().roles_by_id
+
+        return [roles_by_id[role_id] for role_id in role_ids if role_id in roles_by_id]
+
+    def get_role_by_name(self, name: str) -> Optional[ReferenceRow]:
+        return self.data.roles_by_name.get(name)
+
+    def get_network(self, network_id) -> Optional[ReferenceRow]:
+        return self.data.networks_by_id.get(str(network_id))
+
+    def get_network_by_name(self, name: str) -> Optional[ReferenceRow]:
+        return self.data.networks_by_name.get(name)
+
+
+reference_cache = ReferenceCache()
+
+
+def get_default_role_id() -> uuid.UUID:
+    """
+    id роли, которая выдаётся при регистрации.
+
+    Если роли ещё нет, она создаётся в транзакции вызывающего, а справочники сбрасываются после её commit.
+    """
+    role = reference_cache.get_role_by_name(settings.DEFAULT_ROLE_NAME)
+    if role is not None:
+        return role.id
+
+    new_role = Role(id=uuid.uuid4(), name=settings.DEFAULT_ROLE_NAME, description=settings.DEFAULT_ROLE_DESCRIPTION)
+    db.session.add(new_role)
+    db.session.flush()
+    event.listen(db.session(), 'after_commit', lambda session: reference_cache.invalidate(), once=True)
+    return new_role.id
@@ -0,0 +1,141 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Optional
+
+from flask_sqlalchemy import SignallingSession, SQLAlchemy
+from sqlalchemy import create_engine, event, orm, text
+from sqlalchemy.engine import Engine
+
+from app_settings.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Отставание реплики в секундах. 0, если реплика проиграла всё, что получила.
+REPLICA_LAG_QUERY = text("""
+    SELECT CASE
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+_use_replica = ContextVar('use_replica', default=False)
+
+
+class ReplicaRouter:
+    """
+    Реплика для запросов только на чтение.
+
+    Реплика используется, пока её отставание не больше DB_REPLICA_MAX_LAG.
+    Отставание проверяется не чаще раза в DB_REPLICA_CHECK_INTERVAL секунд,
+    если реплика недоступна или отстаёт - запросы идут в основную базу.
+    """
+
+    def __init__(self):
+        self.engine: Optional[Engine] = None
+        self.lag: Optional[float] = None
+        self._available = False
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def init_app(self, engine_options: dict):
+        if not settings.DATABASE_REPLICA_URL or self.engine is not None:
+            return
+
+        options = {key: value for key, value in engine_options.items() if key != 'poolclass'}
+        self.engine = create_engine(settings.DATABASE_REPLICA_URL, **options)
+
+    def _check(self):
+        try:
+            with self.engine.connect() as connection:
+                self.lag = float(connection.execute(REPLICA_LAG_QUERY).scalar())
+            self._available = self.lag <= settings.DB_REPLICA_MAX_LAG
+        except Exception:
+            logger.exception('Replica lag check failed')
+            self.lag = None
+            self._available = False
+
+        if not self._available:
+            logger.warning('Replica is not used, lag: %s', self.lag)
+
+    def is_available(self) -> bool:
+        if self.engine is None:
+            return False
+
+        if time.monotonic() - self._checked_at > settings.DB_REPLICA_CHECK_INTERVAL:
+            # Проверяет один поток, остальные пока используют прошлый результат.
+            if self._lock.acquire(blocking=False):
+                try:
+                    self._check()
+                    self._checked_at = time.monotonic()
+                finally:
+                    self._lock.release()
+
+        return self._available
+
+
+replica_router = ReplicaRouter()
+
+
+class RoutingSession(SignallingSession):
+    """
+    Сессия, которая внутри read_only отправляет запросы в реплику.
+
+    Запись и всё, что выполняется в сессии после записи, остаётся в основной базе (read-your-writes).
+    """
+
+    def get_bind(self, mapper=None, clause=None):
+        if (
+            _use_replica.get()
+            and not self._flushing
+            and not self.info.get('has_writes')
+            and not (self.new or self.dirty or self.deleted)
+            and replica_router.is_available()
+        ):
+            return replica_router.engine
+
+        return super().get_bind(mapper, clause)
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _remember_writes(session, flush_context):
+    session.info['has_writes'] = True
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+
+@contextmanager
+def replica():
+    """Запросы внутри блока можно выполнять на реплике."""
+    token = _use_replica.set(True)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+@contextmanager
+def primary():
+    """Запросы внутри блока выполняются в основной базе, даже внутри read_only."""
+    token = _use_replica.set(False)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+def read_only(func):
+    """Декоратор представления, которое только читает данные и допускает небольшое отставание."""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with replica():
+            return func(*args, **kwargs)
+
+    return wrapper
@@ -3,5 +3,7 @@
 set -e
 python3 utils/wait_for_redis.py
 python3 utils/wait_for_postgres.py
+python3 authorization/jwt/keys.py generate --if-missing
 flask db upgrade
+python3 db/partitions.py maintain
 gunicorn wsgi_app:app --bind 0.0.0.0:5000
\ No newline at end of file
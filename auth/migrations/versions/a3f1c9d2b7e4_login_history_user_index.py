@@ -0,0 +1,24 @@
+"""login_history user index
+
+Revision ID: a3f1c9d2b7e4
+Revises: 4c0ec472849b
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3f1c9d2b7e4'
+down_revision = '4c0ec472849b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Индекс на партиционированной таблице создаётся во всех существующих и будущих партициях.
+    op.create_index('ix_login_history_user_id_created_at', 'login_history', ['user_id', 'created_at'])
+
+
+def downgrade():
+    op.drop_index('ix_login_history_user_id_created_at', table_name='login_history')
@@ -4,8 +4,11 @@ from flask_wtf import FlaskForm
 from wtforms import StringField
 from wtforms.validators import UUID
 
+from db.cache import roles_cache
 from db.initial import db
 from db.models import Role
+from db.reference import reference_cache
+from db.queries import get_entity, get_role_user_ids
 from utils.validators import RoleIdExistsValidator, RoleNameValidator
 
 
@@ -47,7 +50,7 @@ class RoleChangeForm(FlaskForm):
         if not self.validate():
             return
 
-        changed_role = Role.query.filter_by(id=self.data['role_id']).first()
+        changed_role = get_entity(Role, self.data['role_id'])
 
         if self.data.get('name'):
             changed_role.name = self.data['name']
@@ -56,4 +59,6 @@ class RoleChangeForm(FlaskForm):
             changed_role.description = self.data['description']
 
         db.session.commit()
+        reference_cache.invalidate()
+        roles_cache.invalidate(get_role_user_ids(changed_role.id))
         return changed_role
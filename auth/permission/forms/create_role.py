@@ -6,6 +6,7 @@ from wtforms.validators import InputRequired
 
 from db.initial import db
 from db.models import Role
+from db.reference import reference_cache
 from utils.validators import RoleNameValidator
 
 
@@ -40,4 +41,5 @@ class RoleCreateForm(FlaskForm):
         )
         db.session.add(new_role)
         db.session.commit()
+        reference_cache.invalidate()
         return new_role
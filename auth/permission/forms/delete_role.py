@@ -4,8 +4,11 @@ from flask_wtf import FlaskForm
 from wtforms import StringField
 from wtforms.validators import UUID
 
+from db.cache import roles_cache
 from db.initial import db
 from db.models import Role
+from db.reference import reference_cache
+from db.queries import get_role_user_ids
 from utils.validators import RoleIdExistsValidator
 
 
@@ -28,6 +31,9 @@ class RoleDeleteForm(FlaskForm):
         if not self.validate():
             return
 
+        user_ids = get_role_user_ids(self.data['role_id'])
         deleted_role = Role.query.filter_by(id=self.data['role_id']).delete()
         db.session.commit()
+        reference_cache.invalidate()
+        roles_cache.invalidate(user_ids)
         return deleted_role
@@ -4,7 +4,7 @@ from flask_wtf import FlaskForm
 from wtforms import StringField
 from wtforms.validators import UUID
 
-from db.queries import get_active_user_roles
+from db.cache import roles_cache
 from permission.forms.set_role import UserIdExistsValidator
 
 
@@ -27,10 +27,4 @@ class GetUserRolesForm(FlaskForm):
         if not self.validate():
             return
 
-        roles_query = get_active_user_roles(self.data['user_id'])
-
-        return [{
-            'id': role.id,
-            'name': role.name,
-            'description': role.description,
-        } for role in roles_query]
+        return roles_cache.get(self.data['user_id'])
@@ -0,0 +1,61 @@
+import uuid
+from typing import List, Optional
+
+from flask_wtf import FlaskForm
+from wtforms import Field, StringField
+from wtforms.validators import UUID, Optional as OptionalValidator, ValidationError
+
+from db.queries import get_role_user_ids
+from utils.validators import RoleIdExistsValidator
+
+
+class UUIDListField(Field):
+    """Список UUID, переданный несколькими значениями одного ключа."""
+
+    def process_formdata(self, valuelist):
+        self.data = valuelist
+
+    def pre_validate(self, form):
+        for value in self.data or []:
+            try:
+                uuid.UUID(str(value))
+            except ValueError:
+                raise ValidationError(f'Invalid user id: {value}')
+
+
+class RevokeTokensForm(FlaskForm):
+    """
+    Форма массового отзыва refresh-токенов: по списку пользователей и/или по роли.
+    """
+    class Meta:
+        csrf = False
+
+    user_ids = UUIDListField('user_ids')
+
+    role_id = StringField(
+        'role_id',
+        validators=[
+            OptionalValidator(), UUID(), RoleIdExistsValidator('No role with this id')
+        ]
+    )
+
+    def validate(self, *args, **kwargs):
+        result = super().validate(*args, **kwargs)
+
+        user_ids, role_id = self._fields['user_ids'], self._fields['role_id']
+        if not user_ids.data and not role_id.data:
+            user_ids.errors = role_id.errors = ['Fill in at least one field']
+            result = False
+
+        return result
+
+    def get_user_ids(self) -> Optional[List[str]]:
+        """Возвращает id пользователей без повторов."""
+        if not self.validate():
+            return
+
+        user_ids = {str(uuid.UUID(str(user_id))) for user_id in self.data['user_ids'] or []}
+        if self.data['role_id']:
+            user_ids.update(str(user_id) for user_id in get_role_user_ids(self.data['role_id']))
+
+        return sorted(user_ids)
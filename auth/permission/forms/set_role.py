@@ -5,8 +5,10 @@ from flask_wtf import FlaskForm
 from wtforms import StringField
 from wtforms.validators import UUID
 
+from db.cache import roles_cache
 from db.initial import db
 from db.models import Role, RoleRelation, User
+from db.queries import get_entity
 from permission.forms.delete_role import RoleIdExistsValidator
 from utils.validators import UserIdExistsValidator
 
@@ -37,8 +39,8 @@ class RoleSetForm(FlaskForm):
         if not self.validate():
             return
 
-        role = Role.query.filter_by(id=self.data['role_id']).first()
-        user = User.query.filter_by(id=self.data['user_id']).first()
+        role = get_entity(Role, self.data['role_id'])
+        user = get_entity(User, self.data['user_id'])
 
         new_relatio = RoleRelation(
             user_id=user.id,
@@ -46,6 +48,7 @@ class RoleSetForm(FlaskForm):
         )
         db.session.add(new_relatio)
         db.session.commit()
+        roles_cache.invalidate([user.id])
         return new_relatio
 
 
@@ -56,8 +59,8 @@ class RoleResetForm(RoleSetForm):
         if not self.validate():
             return
 
-        role = Role.query.filter_by(id=self.data['role_id']).first()
-        user = User.query.filter_by(id=self.data['user_id']).first()
+        role = get_entity(Role, self.data['role_id'])
+        user = get_entity(User, self.data['user_id'])
 
         new_relatio = RoleRelation.query.filter_by(
             user_id=user.id,
@@ -66,4 +69,5 @@ class RoleResetForm(RoleSetForm):
             'finish_at': datetime.utcnow()
         })
         db.session.commit()
+        roles_cache.invalidate([user.id])
         return new_relatio
@@ -0,0 +1,75 @@
+"""
+Бенчмарк накладных расходов jwt_required_with_roles на один запрос.
+
+Сравнивает полную проверку подписи (jwt_required из flask_jwt_extended)
+с декоратором, который берёт уже проверенный токен из кеша.
+Запуск из директории auth:
+    python tests/benchmarks/jwt_roles_benchmark.py --requests 20000
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from cryptography.hazmat.primitives import serialization
+from flask import Flask
+from flask_jwt_extended import JWTManager, create_access_token, jwt_required
+
+from app_settings.settings import settings
+from authorization.jwt.extra import jwt_required_with_roles, verified_tokens
+from authorization.jwt.keys import PRIVATE_SUFFIX, generate_private_key, init_jwt_keys, is_asymmetric, key_ring
+
+
+def view():
+    return 'ok'
+
+
+def bench(app, decorated, token: str, requests: int) -> float:
+    """Возвращает среднее время вызова в микросекундах. Каждый вызов - в своём контексте запроса, как в API."""
+    headers = {'Cookie': f'access_token_cookie={token}'}
+    with app.test_request_context(headers=headers):
+        decorated()
+
+    started = time.perf_counter()
+    for _ in range(requests):
+        with app.test_request_context(headers=headers):
+            decorated()
+    return (time.perf_counter() - started) / requests * 1_000_000
+
+
+def use_temporary_signing_key(keys_dir: str):
+    """Подписываем бенчмарк временным ключом, чтобы не зависеть от JWT_KEYS_DIR."""
+    private_key = generate_private_key(settings.JWT_ALGORITHM)
+    (Path(keys_dir) / f'benchmark{PRIVATE_SUFFIX}').write_bytes(private_key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.NoEncryption(),
+    ))
+    key_ring.keys_dir = Path(keys_dir)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=20000)
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    app.config.from_object(settings)
+    jwt = JWTManager(app)
+
+    keys_dir = tempfile.TemporaryDirectory()
+    if is_asymmetric():
+        use_temporary_signing_key(keys_dir.name)
+    init_jwt_keys(jwt)
+
+    with app.app_context():
+        token = create_access_token(identity='user', additional_claims={'roles': ['admin']})
+
+    baseline = bench(app, view, token, args.requests)
+    full = bench(app, jwt_required()(view), token, args.requests)
+    cached = bench(app, jwt_required_with_roles(roles={'admin'})(view), token, args.requests)
+
+    print(f'without decorator:                {baseline:.1f} us')
+    print(f'jwt_required (full verification): {full - baseline:.1f} us overhead')
+    print(f'jwt_required_with_roles (cached): {cached - baseline:.1f} us overhead')
+    print(f'verified tokens cache:            {verified_tokens.stats()}')
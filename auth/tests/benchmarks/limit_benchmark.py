@@ -0,0 +1,52 @@
+"""
+Микробенчмарк лимитера: клиент Redis на каждый запрос против общего пула.
+
+Запуск против локального Redis (например, `docker run -p 6379:6379 redis:6-alpine`):
+    python tests/benchmarks/limit_benchmark.py --host localhost --requests 5000
+"""
+import argparse
+import time
+
+import redis
+
+
+def limit_step(client: redis.Redis, key: str):
+    pipe = client.pipeline()
+    pipe.incr(key, 1)
+    pipe.expire(key, 59)
+    return pipe.execute()
+
+
+def bench_client_per_request(host: str, port: int, requests: int) -> float:
+    """Старое поведение: новый redis.Redis (и новый пул с TCP-соединением) на каждый запрос."""
+    started = time.perf_counter()
+    for _ in range(requests):
+        client = redis.Redis(host=host, port=port, db=0)
+        limit_step(client, 'bench:before')
+        client.connection_pool.disconnect()
+    return requests / (time.perf_counter() - started)
+
+
+def bench_shared_pool(host: str, port: int, requests: int) -> float:
+    """Новое поведение: один пул на процесс."""
+    pool = redis.BlockingConnectionPool(host=host, port=port, db=0, max_connections=10)
+    client = redis.Redis(connection_pool=pool)
+    started = time.perf_counter()
+    for _ in range(requests):
+        limit_step(client, 'bench:after')
+    return requests / (time.perf_counter() - started)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=6379)
+    parser.add_argument('--requests', type=int, default=5000)
+    args = parser.parse_args()
+
+    before = bench_client_per_request(args.host, args.port, args.requests)
+    after = bench_shared_pool(args.host, args.port, args.requests)
+
+    print(f'client per request: {before:.0f} req/s')
+    print(f'shared pool:        {after:.0f} req/s')
+    print(f'speedup:            x{after / before:.1f}')
@@ -1,7 +1,10 @@
 import json
+import time
+import uuid
+import jwt
 import requests
 from http import HTTPStatus
-from ..utils.support import parse_access_token
+from ..utils.support import parse_access_token, parse_refresh_token
 
 
 REGISTRATION_URL = 'http://api:5050/api/v1/auth/registration'
@@ -179,3 +182,173 @@ def test_login_history_success():
 
     assert rh.status_code == HTTPStatus.OK
     assert json.loads(r.content.decode('utf-8')) == {'msg': 'login successful'}
+
+
+JWKS_URL = 'http://api:5050/.well-known/jwks.json'
+
+
+def test_jwks():
+    '''Тест публикации открытых ключей для проверки JWT'''
+    r = requests.get(JWKS_URL)
+
+    assert r.status_code == HTTPStatus.OK
+    assert r.headers['Cache-Control'].startswith('public')
+    keys = json.loads(r.content.decode('utf-8'))['keys']
+    assert keys
+    assert all(key['kid'] and key['use'] == 'sig' for key in keys)
+
+
+REFRESH_URL = 'http://api:5050/api/v1/auth/refresh'
+
+
+def register_and_login(email: str, password: str, user_agent: str = 'functional-tests'):
+    """Регистрирует пользователя и входит под ним, возвращает ответ на вход."""
+    headers = {'X-Request-Id': str(uuid.uuid4()), 'User-Agent': user_agent}
+    requests.post(REGISTRATION_URL, json={"email": email, "password": password}, headers=headers)
+
+    headers['X-Request-Id'] = str(uuid.uuid4())
+    r = requests.post(LOGIN_URL, json={"email": email, "password": password}, headers=headers)
+    assert r.status_code == HTTPStatus.OK
+    return r
+
+
+TEST_EMAIL_10 = "refresh-reuse@world2.com"
+TEST_PASSWORD_10 = "Qweasrty123"
+
+
+def test_refresh_reuse_after_rotation():
+    '''Тест повторного использования refresh-токена после его обмена на новую пару'''
+    r = register_and_login(TEST_EMAIL_10, TEST_PASSWORD_10)
+    refresh_token = parse_refresh_token(r.headers['Set-Cookie'])
+
+    rr = requests.post(REFRESH_URL, cookies=refresh_token, headers={'X-Request-Id': str(uuid.uuid4())})
+    assert rr.status_code == HTTPStatus.OK
+    new_refresh_token = parse_refresh_token(rr.headers['Set-Cookie'])
+    assert new_refresh_token['refresh_token_cookie'] != refresh_token['refresh_token_cookie']
+
+    reused = requests.post(REFRESH_URL, cookies=refresh_token, headers={'X-Request-Id': str(uuid.uuid4())})
+    assert reused.status_code == HTTPStatus.UNAUTHORIZED
+    assert json.loads(reused.content.decode('utf-8')) == {'error': 'Refresh token expired or not valid'}
+
+    rn = requests.post(REFRESH_URL, cookies=new_refresh_token, headers={'X-Request-Id': str(uuid.uuid4())})
+    assert rn.status_code == HTTPStatus.OK
+
+
+SOCIAL_NETWORKS_URL = 'http://api:5050/api/v1/oauth/social-networks'
+
+TEST_EMAIL_11 = "rate-limit@world2.com"
+TEST_PASSWORD_11 = "Qweasrty123"
+
+
+def test_rate_limit_exceeded():
+    '''Тест ответа 429 и заголовков лимита после исчерпания лимита запросов'''
+    r = register_and_login(TEST_EMAIL_11, TEST_PASSWORD_11)
+    access_token = parse_access_token(r.headers['Set-Cookie'])
+
+    responses = []
+    # Локальный уровень лимитера может пропустить немного больше лимита, поэтому запросов с запасом.
+    for _ in range(60):
+        rl = requests.get(SOCIAL_NETWORKS_URL, cookies=access_token, headers={'X-Request-Id': str(uuid.uuid4())})
+        responses.append(rl)
+        if rl.status_code == HTTPStatus.TOO_MANY_REQUESTS:
+            break
+
+    first, last = responses[0], responses[-1]
+    assert first.status_code == HTTPStatus.OK
+    assert first.headers['X-RateLimit-Limit'] == '20'
+    assert int(first.headers['X-RateLimit-Remaining']) < 20
+
+    assert last.status_code == HTTPStatus.TOO_MANY_REQUESTS
+    assert len(responses) > 20
+    assert last.headers['X-RateLimit-Limit'] == '20'
+    assert last.headers['X-RateLimit-Remaining'] == '0'
+    assert int(last.headers['Retry-After']) >= 1
+    assert 'X-RateLimit-Reset' in last.headers
+
+
+TEST_EMAIL_12 = "login-history-flush@world2.com"
+TEST_PASSWORD_12 = "Qweasrty123"
+
+
+def get_login_history_page(access_token: dict, **params) -> dict:
+    r = requests.get(
+        LOGIN_HISTORY_URL,
+        params=params,
+        cookies=access_token,
+        headers={'X-Request-Id': str(uuid.uuid4())},
+    )
+    assert r.status_code == HTTPStatus.OK
+    return json.loads(r.content.decode('utf-8'))
+
+
+def test_login_history_written_after_flush():
+    '''Тест появления входа в истории после записи пачки фоновым писателем'''
+    user_agent = f'functional-tests/{uuid.uuid4()}'
+    r = register_and_login(TEST_EMAIL_12, TEST_PASSWORD_12, user_agent=user_agent)
+    access_token = parse_access_token(r.headers['Set-Cookie'])
+
+    # Вход пишется в историю асинхронно: ждём несколько интервалов LOGIN_HISTORY_FLUSH_INTERVAL_MS.
+    deadline = time.monotonic() + 10
+    while True:
+        items = get_login_history_page(access_token, per_page=100)['items']
+        if any(item['user_agent'] == user_agent for item in items) or time.monotonic() > deadline:
+            break
+        time.sleep(0.5)
+
+    assert [item['user_agent'] for item in items].count(user_agent) == 1
+
+
+TEST_EMAIL_13 = "login-history-cursor@world2.com"
+TEST_PASSWORD_13 = "Qweasrty123"
+
+
+def test_login_history_cursor_pagination():
+    '''Тест постраничного вывода истории по курсору без повторов и пропусков'''
+    user_agents = [f'functional-tests/{n}/{uuid.uuid4()}' for n in range(7)]
+    r = register_and_login(TEST_EMAIL_13, TEST_PASSWORD_13, user_agent=user_agents[0])
+    for user_agent in user_agents[1:]:
+        r = requests.post(
+            LOGIN_URL,
+            json={"email": TEST_EMAIL_13, "password": TEST_PASSWORD_13},
+            headers={'X-Request-Id': str(uuid.uuid4()), 'User-Agent': user_agent},
+        )
+        assert r.status_code == HTTPStatus.OK
+    access_token = parse_access_token(r.headers['Set-Cookie'])
+
+    deadline = time.monotonic() + 10
+    while get_login_history_page(access_token, cursor='', total='exact')['total'] < len(user_agents):
+        assert time.monotonic() < deadline
+        time.sleep(0.5)
+
+    pages, cursor = [], ''
+    while cursor is not None:
+        page = get_login_history_page(access_token, cursor=cursor, per_page=3)
+        pages.append([item['user_agent'] for item in page['items']])
+        cursor = page['next_cursor']
+        assert len(pages) <= len(user_agents)
+
+    seen = [user_agent for page in pages for user_agent in page]
+    assert [len(page) for page in pages] == [3, 3, 1]
+    assert len(seen) == len(set(seen))
+    assert sorted(seen) == sorted(user_agents)
+
+
+USER_ROLES_URL = 'http://api:5050/api/v1/user-roles/{user_id}'
+
+TEST_EMAIL_14 = "verified-token-cache@world2.com"
+TEST_PASSWORD_14 = "Qweasrty123"
+
+
+def test_repeated_requests_with_same_access_token():
+    '''Тест повторных запросов с тем же access-токеном: второй берёт проверенный токен из кеша'''
+    r = register_and_login(TEST_EMAIL_14, TEST_PASSWORD_14)
+    access_token = parse_access_token(r.headers['Set-Cookie'])
+    user_id = jwt.decode(access_token['access_token_cookie'], options={'verify_signature': False})['sub']
+
+    for _ in range(2):
+        rr = requests.get(
+            USER_ROLES_URL.format(user_id=user_id),
+            cookies=access_token,
+            headers={'X-Request-Id': str(uuid.uuid4())},
+        )
+        assert rr.status_code == HTTPStatus.OK
@@ -0,0 +1,71 @@
+import threading
+import time
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from authorization.services.http_client import ProviderClient, ProviderUnavailableError
+
+
+class FakeProviderHandler(BaseHTTPRequestHandler):
+    """Фейковый OAuth-провайдер: /slow отвечает дольше таймаута чтения, /flaky - сначала 503, потом 200."""
+
+    calls = {}
+
+    def do_GET(self):
+        calls = self.calls[self.path] = self.calls.get(self.path, 0) + 1
+
+        if self.path == '/slow':
+            time.sleep(0.5)
+        status = HTTPStatus.SERVICE_UNAVAILABLE if self.path == '/flaky' and calls == 1 else HTTPStatus.OK
+
+        self.send_response(status)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'{}')
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def provider_url():
+    FakeProviderHandler.calls = {}
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeProviderHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{server.server_port}'
+    server.shutdown()
+
+
+@pytest.fixture
+def client():
+    client = ProviderClient('fake')
+    client.timeout = (1, 0.2)
+    client.backoff = 0
+    client.retries = 2
+    return client
+
+
+def test_token_exchange_is_not_retried_after_read_timeout(provider_url, client):
+    '''Запрос с одноразовым кодом не повторяется, если он мог дойти до провайдера'''
+    with pytest.raises(ProviderUnavailableError):
+        client.get(f'{provider_url}/slow', idempotent=False)
+
+    assert FakeProviderHandler.calls['/slow'] == 1
+
+
+def test_idempotent_get_is_retried(provider_url, client):
+    '''Обычный GET повторяется после 503'''
+    response = client.get(f'{provider_url}/flaky')
+
+    assert response.status_code == HTTPStatus.OK
+    assert FakeProviderHandler.calls['/flaky'] == 2
+
+
+def test_non_idempotent_request_is_not_retried_after_503(provider_url, client):
+    '''Ответ 503 на обмен кода не повторяется'''
+    response = client.get(f'{provider_url}/flaky', idempotent=False)
+
+    assert response.status_code == HTTPStatus.SERVICE_UNAVAILABLE
+    assert FakeProviderHandler.calls['/flaky'] == 1
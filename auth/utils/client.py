@@ -1,8 +1,40 @@
+import hashlib
+from typing import NamedTuple
+
 from werkzeug.useragents import UserAgent
 
+from app_settings.settings import settings
+from db.models import LoginHistory
+from utils.cache import LocalCache
+
+# Разобранные user-agent: sha1 строки -> UserAgent. Разбор детерминирован, поэтому записи не устаревают.
+user_agents_cache = LocalCache(maxsize=settings.USER_AGENT_CACHE_SIZE, ttl=float('inf'))
+
+
+class ParsedUserAgent(NamedTuple):
+    user_agent: str
+    platform: str
+    browser: str
+
 
 def string_as_user_agent(row_string: str):
-    return UserAgent(row_string)
+    key = hashlib.sha1(row_string.encode()).digest()
+    user_agent = user_agents_cache.get(key)
+    if user_agent is None:
+        user_agent = UserAgent(row_string)
+        user_agents_cache.set(key, user_agent)
+    return user_agent
+
+
+def parse_user_agent(row_string: str) -> ParsedUserAgent:
+    """Поля user-agent для login_history, обрезанные по длине колонок."""
+    user_agent = string_as_user_agent(row_string or '')
+    fitted = LoginHistory.fit_string_fields({
+        'user_agent': user_agent.string,
+        'platform': user_agent.platform,
+        'browser': user_agent.browser,
+    })
+    return ParsedUserAgent(**{field: fitted[field] for field in ParsedUserAgent._fields})
 
 
 def user_agent_as_string(user_agent: UserAgent):
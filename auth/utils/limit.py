@@ -1,31 +1,288 @@
-import datetime
+import math
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import wraps
 from http import HTTPStatus
 
-import redis
-from flask import request, jsonify
+from flask import jsonify, make_response, request
+from flask_jwt_extended import get_jwt_identity
 
 from app_settings.settings import settings
+from db.no_sql import redis_client
 
+RATE_KEY = 'rate::'
 
-def limit(func):
-    """Декоратор на ограничение запросов по времени при помощи Redis."""
+# Оба скрипта берут время с сервера Redis, чтобы часы воркеров не влияли на лимит,
+# и возвращают {allowed, remaining, retry_after_ms, reset_ms}.
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local window_ms = tonumber(ARGV[2])
+local pending = tonumber(ARGV[3]) or 0
+local time = redis.call('TIME')
+local now = time[1] * 1000 + math.floor(time[2] / 1000)
+local rate = capacity / window_ms
 
-    def wrapper(*args, **kwargs):
-        redis_conn = redis.Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT, db=0)
-        pipe = redis_conn.pipeline()
-        now = datetime.datetime.now()
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
 
-        ip = request.remote_addr or '127.0.0.1'
-        key = f'{ip}:{now.minute}'
+-- Запросы, уже пропущенные локальным уровнем, списываются безусловно.
+tokens = math.max(tokens - pending, -capacity)
 
-        pipe.incr(key, 1)
-        pipe.expire(key, 59)
+local allowed = 0
+local retry_after = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    retry_after = math.ceil((1 - tokens) / rate)
+end
 
-        result = pipe.execute()
-        request_number = result[0]
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], window_ms)
 
-        if request_number > settings.REQUEST_LIMIT_PER_MINUTE:
-            return jsonify('Too Many Requests'), HTTPStatus.TOO_MANY_REQUESTS
+return {allowed, math.floor(tokens), retry_after, math.ceil((capacity - tokens) / rate)}
+"""
 
-        return func(*args, **kwargs)
-    return wrapper
+SLIDING_LOG_SCRIPT = """
+local limit = tonumber(ARGV[1])
+local window_ms = tonumber(ARGV[2])
+local time = redis.call('TIME')
+local now = time[1] * 1000 + math.floor(time[2] / 1000)
+
+redis.call('ZREMRANGEBYSCORE', KEYS[1], 0, now - window_ms)
+local count = redis.call('ZCARD', KEYS[1])
+
+local allowed = 0
+if count < limit then
+    redis.call('ZADD', KEYS[1], now, ARGV[3])
+    count = count + 1
+    allowed = 1
+end
+redis.call('PEXPIRE', KEYS[1], window_ms)
+
+local oldest = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+local reset = 0
+if oldest[2] then
+    reset = tonumber(oldest[2]) + window_ms - now
+end
+
+local retry_after = 0
+if allowed == 0 then
+    retry_after = reset
+end
+
+return {allowed, limit - count, retry_after, reset}
+"""
+
+
+@dataclass
+class RateLimitResult:
+    allowed: bool
+    limit: int
+    remaining: int
+    retry_after: float
+    reset: float
+
+    @classmethod
+    def from_script(cls, limit: int, reply: list) -> 'RateLimitResult':
+        allowed, remaining, retry_after_ms, reset_ms = reply
+        return cls(
+            allowed=bool(allowed),
+            limit=limit,
+            remaining=max(int(remaining), 0),
+            retry_after=retry_after_ms / 1000,
+            reset=reset_ms / 1000,
+        )
+
+    @property
+    def headers(self) -> dict:
+        headers = {
+            'X-RateLimit-Limit': str(self.limit),
+            'X-RateLimit-Remaining': str(self.remaining),
+            'X-RateLimit-Reset': str(math.ceil(self.reset)),
+        }
+        if not self.allowed:
+            headers['Retry-After'] = str(max(math.ceil(self.retry_after), 1))
+        return headers
+
+
+class RateLimiter:
+    """
+    Лимитер запросов на Redis.
+
+    Каждая проверка - один вызов EVALSHA (redis-py сам загрузит скрипт при NOSCRIPT),
+    то есть один round trip вместо пайплайна INCR + EXPIRE.
+    """
+
+    scripts = {
+        'token_bucket': TOKEN_BUCKET_SCRIPT,
+        'sliding_log': SLIDING_LOG_SCRIPT,
+    }
+
+    def __init__(self, client, strategy: str, window: int = 60):
+        self.strategy = strategy
+        self.window_ms = window * 1000
+        self.script = client.register_script(self.scripts[strategy])
+
+    def hit(self, key: str, limit: int, pending: int = 0) -> RateLimitResult:
+        """
+        Проверяет один запрос.
+
+        :param pending: сколько запросов уже пропущено локально и должно быть списано (только token_bucket)
+        """
+        args = [limit, self.window_ms]
+        if self.strategy == 'sliding_log':
+            args.append(uuid.uuid4().hex)
+        else:
+            args.append(pending)
+
+        reply = self.script(keys=[f'{RATE_KEY}{self.strategy}::{key}'], args=args)
+        return RateLimitResult.from_script(limit, reply)
+
+
+class LocalBucket:
+    """Последнее известное от Redis состояние ведра и локально пропущенные с тех пор запросы."""
+
+    __slots__ = ('remaining', 'pending', 'synced_at', 'blocked_until', 'reset_at')
+
+    def __init__(self):
+        self.remaining = 0
+        self.pending = 0
+        self.synced_at = 0.0
+        self.blocked_until = 0.0
+        self.reset_at = 0.0
+
+
+class LocalRateLimiter:
+    """
+    Локальный уровень лимитера в памяти воркера перед Redis.
+
+    Если клиент явно далеко от лимита, запрос пропускается локально и копится в pending;
+    если Redis недавно ответил отказом, запрос отклоняется локально до истечения Retry-After.
+    В остальных случаях (и не реже раза в sync_interval секунд) накопленное списывается
+    в Redis одним вызовом вместе с текущим запросом.
+
+    Локально за один интервал воркер пропускает не больше limit * margin запросов -
+    это и есть допустимая погрешность лимита. Ведра хранятся в LRU на size ключей.
+    """
+
+    def __init__(self, limiter: RateLimiter, size: int, margin: float, sync_interval: float):
+        self.limiter = limiter
+        self.size = size
+        self.margin = margin
+        self.sync_interval = sync_interval
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _local_hit(self, bucket: LocalBucket, limit: int, now: float):
+        if now < bucket.blocked_until:
+            return RateLimitResult(
+                allowed=False,
+                limit=limit,
+                remaining=0,
+                retry_after=bucket.blocked_until - now,
+                reset=max(bucket.reset_at - now, 0),
+            )
+
+        estimate = bucket.remaining - bucket.pending
+        if (
+            now - bucket.synced_at < self.sync_interval
+            and bucket.pending < limit * self.margin
+            and estimate > 1
+        ):
+            bucket.pending += 1
+            return RateLimitResult(
+                allowed=True,
+                limit=limit,
+                remaining=estimate - 1,
+                retry_after=0,
+                reset=max(bucket.reset_at - now, 0),
+            )
+
+    def hit(self, key: str, limit: int) -> RateLimitResult:
+        now = time.monotonic()
+
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = LocalBucket()
+                if len(self._buckets) > self.size:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+
+            result = self._local_hit(bucket, limit, now)
+            if result is not None:
+                return result
+
+            pending, bucket.pending = bucket.pending, 0
+
+        result = self.limiter.hit(key, limit, pending=pending)
+
+        with self._lock:
+            bucket.remaining = result.remaining
+            bucket.synced_at = now
+            bucket.reset_at = now + result.reset
+            bucket.blocked_until = 0.0 if result.allowed else now + result.retry_after
+
+        return result
+
+
+rate_limiter = RateLimiter(redis_client, settings.RATE_LIMIT_STRATEGY)
+
+# Локальный уровень имеет смысл только для token_bucket: sliding_log хранит точные отметки времени.
+if settings.RATE_LIMIT_LOCAL_ENABLED and settings.RATE_LIMIT_STRATEGY == 'token_bucket':
+    rate_limiter = LocalRateLimiter(
+        rate_limiter,
+        size=settings.RATE_LIMIT_LOCAL_SIZE,
+        margin=settings.RATE_LIMIT_LOCAL_MARGIN,
+        sync_interval=settings.RATE_LIMIT_LOCAL_SYNC_INTERVAL,
+    )
+
+
+def get_identity(by: str) -> str:
+    """Ключ клиента: id пользователя из JWT, если он уже проверен, иначе IP."""
+    if by == 'user':
+        try:
+            user_id = get_jwt_identity()
+        except RuntimeError:
+            user_id = None
+        if user_id:
+            return f'user:{user_id}'
+
+    return f'ip:{request.remote_addr or "127.0.0.1"}'
+
+
+def limit(func=None, per_minute: int = None, by: str = 'user'):
+    """
+    Декоратор на ограничение запросов по времени при помощи Redis.
+
+    Можно использовать как @limit или @limit(per_minute=10, by='ip').
+    Лимит берётся из RATE_LIMITS по имени эндпоинта, затем из per_minute,
+    затем из REQUEST_LIMIT_PER_MINUTE.
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            endpoint = request.endpoint or fn.__name__
+            requests_limit = settings.RATE_LIMITS.get(endpoint) or per_minute or settings.REQUEST_LIMIT_PER_MINUTE
+
+            result = rate_limiter.hit(f'{endpoint}::{get_identity(by)}', requests_limit)
+
+            if not result.allowed:
+                response = make_response(jsonify('Too Many Requests'), HTTPStatus.TOO_MANY_REQUESTS)
+            else:
+                response = make_response(fn(*args, **kwargs))
+
+            response.headers.extend(result.headers)
+            return response
+        return wrapper
+
+    if func is not None:
+        return decorator(func)
+    return decorator
@@ -1,29 +1,96 @@
+import time
 from functools import wraps
 
-from flask import current_app, request
+from flask import Flask, current_app, request
 import opentracing
 from flask_opentracing import FlaskTracer
 from jaeger_client import Config
+from jaeger_client.sampler import AdaptiveSampler
+from opentracing.ext import tags
 
+from app_settings.settings import settings
 
-def _setup_jaeger():
-    config = Config(
+
+class SamplingConfig(Config):
+    """Config jaeger_client с сэмплером по операциям, который нельзя описать словарём конфигурации."""
+
+    def __init__(self, *args, custom_sampler=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.custom_sampler = custom_sampler
+
+    @property
+    def sampler(self):
+        return self.custom_sampler or super().sampler
+
+
+def create_sampler():
+    """
+    Сэмплер по операциям (операция - endpoint Flask): своя вероятность для endpoint'ов из
+    TRACING_OPERATION_SAMPLING и не меньше TRACING_LOWER_BOUND_PER_SECOND трасс в секунду для каждого.
+    Нужен только для probabilistic, остальные типы jaeger_client строит сам.
+    """
+    if settings.TRACING_SAMPLER_TYPE != 'probabilistic':
+        return None
+    if not settings.TRACING_OPERATION_SAMPLING and not settings.TRACING_LOWER_BOUND_PER_SECOND:
+        return None
+
+    return AdaptiveSampler({
+        'defaultSamplingProbability': settings.TRACING_SAMPLER_PARAM,
+        'defaultLowerBoundTracesPerSecond': settings.TRACING_LOWER_BOUND_PER_SECOND,
+        'perOperationStrategies': [
+            {'operation': operation, 'probabilisticSampling': {'samplingRate': rate}}
+            for operation, rate in settings.TRACING_OPERATION_SAMPLING.items()
+        ],
+    }, max_operations=settings.TRACING_MAX_OPERATIONS)
+
+
+def create_tracer():
+    config = SamplingConfig(
         config={
             'sampler': {
-                'type': 'const',
-                'param': 1,
+                'type': settings.TRACING_SAMPLER_TYPE,
+                'param': settings.TRACING_SAMPLER_PARAM,
             },
             'local_agent': {
-                'reporting_host': "jaeger",
-                'reporting_port': 6831,
+                'reporting_host': settings.JAEGER_HOST,
+                'reporting_port': settings.JAEGER_PORT,
             },
         },
         service_name='auth',
         validate=True,
+        custom_sampler=create_sampler(),
     )
     return config.initialize_tracer()
 
 
+def init_tracing(app: Flask) -> FlaskTracer:
+    """
+    Подключает трассировку всех запросов.
+
+    Запрос, не попавший в выборку, всё равно отправляется в Jaeger, если он завершился ошибкой 5xx
+    или шёл дольше TRACING_SLOW_REQUEST_MS. Решение принимается в конце запроса, поэтому
+    от таких запросов сохраняется корневой span, а уже завершённые вложенные span'ы теряются.
+    """
+    tracer = FlaskTracer(create_tracer, True, app=app)
+    app.tracer = tracer
+
+    @app.after_request
+    def sample_errors_and_slow_requests(response):
+        span = tracer.get_span()
+        if span is None or span.is_sampled():
+            return response
+
+        is_error = settings.TRACING_SAMPLE_ERRORS and response.status_code >= 500
+        is_slow = (time.time() - span.start_time) * 1000 >= settings.TRACING_SLOW_REQUEST_MS
+        if is_error or is_slow:
+            span.set_tag(tags.SAMPLING_PRIORITY, 1)
+            span.set_tag(tags.HTTP_STATUS_CODE, response.status_code)
+
+        return response
+
+    return tracer
+
+
 def trace(operation_name: str):
 
     operation_name = operation_name or 'mega-trace'
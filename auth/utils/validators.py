@@ -1,7 +1,7 @@
-from sqlalchemy.exc import SQLAlchemyError
 from wtforms.validators import Email, Length, ValidationError
 
 from db.models import Role, User
+from db.queries import exists, get_entity
 
 
 class RegistrationEmail(Email):
@@ -9,8 +9,7 @@ class RegistrationEmail(Email):
     def __call__(self, form, field):
         super().__call__(form, field)
 
-        exists_user = User.query.filter_by(email=field.data).count()
-        if exists_user:
+        if exists(User.query.filter_by(email=field.data)):
             raise ValidationError('User with this email address already exists')
 
 
@@ -28,8 +27,7 @@ class RoleNameValidator:
         self.message = message
 
     def __call__(self, form, field):
-        exists_name = Role.query.filter_by(name=field.data).count()
-        if exists_name:
+        if exists(Role.query.filter_by(name=field.data)):
             raise ValidationError(self.message)
 
 
@@ -40,11 +38,7 @@ class RoleIdExistsValidator:
         self.message = message
 
     def __call__(self, form, field):
-        try:
-            exists_role = Role.query.filter_by(id=field.data).count()
-        except SQLAlchemyError:
-            raise ValidationError(self.message)
-        if not exists_role:
+        if get_entity(Role, field.data) is None:
             raise ValidationError(self.message)
 
 
@@ -55,10 +49,5 @@ class UserIdExistsValidator:
         self.message = message
 
     def __call__(self, form, field):
-        try:
-            exists_user = User.query.filter_by(id=field.data).count()
-        except SQLAlchemyError:
-            raise ValidationError(self.message)
-        if not exists_user:
+        if get_entity(User, field.data) is None:
             raise ValidationError(self.message)
-
@@ -3,5 +3,10 @@ from gevent import monkey
 monkey.patch_all()
 
 from app import main
+from app_settings.settings import settings
+from db.partitions import start_maintenance_schedule
 
 app = main()
+
+if settings.LOGIN_HISTORY_PARTITIONS_INTERVAL:
+    start_maintenance_schedule(app)